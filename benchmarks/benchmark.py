@@ -0,0 +1,365 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+
+Benchmarks the move search on the positions in positions.json, phase by phase
+(populating the board, anchors, cross checks, scoring tables and move
+generation), and reports latency percentiles, the number of anchors searched,
+search nodes expanded and moves generated, and the peak memory of each position.
+It also searches every move of each position once, counting the moves that
+are generated more than once, and fails if there are any.
+
+The report can be saved as a baseline, and later runs fail if a position got
+slower (or expands more nodes) than the baseline by more than the threshold.
+With --check, runs fail if the pruned search for the k best moves of a
+position doesn't find exactly the k best moves of the exhaustive search.
+
+Usage: python benchmarks/benchmark.py [--repeat N] [--k K] [--save] [--baseline PATH]
+                                      [--threshold FRACTION] [--bound SECONDS] [--json PATH]
+                                      [--check]
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.join(BENCHMARKS_PATH, '..', 'src'))
+
+# Every search must run, so the result cache is disabled.
+os.environ['WWF_RESULT_CACHE_SIZE'] = '0'
+
+import best_game_move
+from move_collector import MoveCollector
+
+POSITIONS_PATH = os.path.join(BENCHMARKS_PATH, 'positions.json')
+BASELINE_PATH = os.path.join(BENCHMARKS_PATH, 'baseline.json')
+
+# The phases of a search, in order.
+PHASES = ['board', 'anchors', 'cross_checks', 'scoring_tables', 'generation', 'total']
+
+# Slowdowns smaller than this many seconds are timing noise, not regressions.
+MIN_REGRESSION = 0.005
+
+def load_positions():
+    '''
+    Returns {Array<dict>} the benchmark positions, with their gameLetters and userLetters.
+    '''
+
+    with open(POSITIONS_PATH) as positions_file:
+        positions = json.load(positions_file)
+
+    for position in positions:
+        position['gameLetters'] = []
+
+        for i, row in enumerate(position['board']):
+            for j, letter in enumerate(row):
+                if letter != '.':
+                    position['gameLetters'].append({'letter': letter, 'index': i * 15 + j})
+
+        position['userLetters'] = list(position['rack'])
+
+    return positions
+
+def percentile(values, fraction):
+    '''
+    Parameter {Array<float>} values the values (sorted).
+    Parameter {float} fraction the percentile, from 0 to 1.
+    Returns {float} the nearest-rank percentile of the values.
+    '''
+
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def run_position(position, k):
+    '''
+    Searches a position, timing each phase of the search.
+
+    Parameter {dict} position the position, with its gameLetters and userLetters.
+    Parameter {int} k the number of best moves to search for, or None for every move.
+    Returns {tuple} the seconds taken by each phase, and the search counters.
+    '''
+
+    timings = {}
+
+    start = time.perf_counter()
+    game_board = best_game_move.populate_game_board(position['gameLetters'])
+    timings['board'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    anchors = best_game_move.compute_anchors(game_board)
+    timings['anchors'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    across_cross_checks = best_game_move.compute_cross_checks(game_board)
+    down_cross_checks = best_game_move.compute_cross_checks(game_board.transposed())
+    timings['cross_checks'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    across_cross_sums = best_game_move.compute_cross_sums(game_board)
+    down_cross_sums = best_game_move.compute_cross_sums(game_board.transposed())
+    timings['scoring_tables'] = time.perf_counter() - start
+
+    # The generation phase searches on the tables computed above, the way it
+    # does with a game session.
+    tables = SimpleNamespace(
+        game_board=game_board,
+        anchors=anchors,
+        across_cross_checks=across_cross_checks,
+        down_cross_checks=down_cross_checks,
+        across_cross_sums=across_cross_sums,
+        down_cross_sums=down_cross_sums
+    )
+    collector = MoveCollector(k)
+    stats = {}
+
+    start = time.perf_counter()
+    best_game_move.generate_moves(position, collector, tables, stats=stats)
+    timings['generation'] = time.perf_counter() - start
+
+    timings['total'] = sum(timings.values())
+
+    return timings, stats
+
+def measure_memory(position, k):
+    '''
+    Parameter {dict} position the position, with its gameLetters and userLetters.
+    Parameter {int} k the number of best moves to search for, or None for every move.
+    Returns {int} the peak memory allocated while searching the position, in bytes.
+    '''
+
+    tracemalloc.start()
+
+    try:
+        run_position(position, k)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def count_duplicates(position):
+    '''
+    Parameter {dict} position the position, with its gameLetters and userLetters.
+    Returns {int} the number of moves generated more than once, over every move
+    of the position (the collector remembers every move offered).
+    '''
+
+    json_data = {'gameLetters': position['gameLetters'], 'userLetters': position['userLetters']}
+    collector = MoveCollector(count_duplicates=True)
+    best_game_move.generate_moves(json_data, collector)
+
+    return collector.duplicates
+
+def benchmark(positions, k, repeat):
+    '''
+    Parameter {Array<dict>} positions the positions to search.
+    Parameter {int} k the number of best moves to search for, or None for every move.
+    Parameter {int} repeat the number of searches of each position.
+    Returns {dict} the report: the latency percentiles of each phase, over every
+    search, and the latency percentiles, counters and peak memory of each position.
+    '''
+
+    report = {'k': k, 'repeat': repeat, 'phases': {}, 'positions': {}}
+    phase_timings = {phase: [] for phase in PHASES}
+
+    for position in positions:
+        position_timings = {phase: [] for phase in PHASES}
+
+        for _ in range(repeat):
+            timings, stats = run_position(position, k)
+
+            for phase in PHASES:
+                position_timings[phase].append(timings[phase])
+                phase_timings[phase].append(timings[phase])
+
+        report['positions'][position['name']] = {
+            'phases': {
+                phase: {
+                    'p50': percentile(sorted(position_timings[phase]), 0.5),
+                    'p95': percentile(sorted(position_timings[phase]), 0.95)
+                }
+                for phase in PHASES
+            },
+            'anchors': stats['anchors'],
+            'nodes': stats['nodes'],
+            'moves': stats['scored'],
+            'duplicates': count_duplicates(position),
+            'peak_memory': measure_memory(position, k)
+        }
+
+    for phase in PHASES:
+        timings = sorted(phase_timings[phase])
+        report['phases'][phase] = {
+            'p50': percentile(timings, 0.5),
+            'p95': percentile(timings, 0.95),
+            'max': timings[-1]
+        }
+
+    return report
+
+def print_report(report):
+    '''
+    Parameter {dict} report the benchmark report.
+    '''
+
+    print('%-28s %10s %10s %10s %10s %10s %10s %10s' % (
+        'position', 'total p50', 'total p95', 'anchors', 'nodes', 'moves', 'duplicates', 'peak KiB'
+    ))
+
+    for name, position in report['positions'].items():
+        print('%-28s %9.1fms %9.1fms %10d %10d %10d %10d %10d' % (
+            name,
+            position['phases']['total']['p50'] * 1000,
+            position['phases']['total']['p95'] * 1000,
+            position['anchors'],
+            position['nodes'],
+            position['moves'],
+            position['duplicates'],
+            position['peak_memory'] // 1024
+        ))
+
+    print()
+    print('%-28s %10s %10s %10s' % ('phase', 'p50', 'p95', 'max'))
+
+    for phase in PHASES:
+        print('%-28s %9.2fms %9.2fms %9.2fms' % (
+            phase,
+            report['phases'][phase]['p50'] * 1000,
+            report['phases'][phase]['p95'] * 1000,
+            report['phases'][phase]['max'] * 1000
+        ))
+
+def find_regressions(report, baseline, threshold):
+    '''
+    Compares a report with a baseline report.
+
+    Parameter {dict} report the benchmark report.
+    Parameter {dict} baseline the baseline report.
+    Parameter {float} threshold the allowed slowdown, as a fraction of the baseline.
+    Returns {Array<str>} a description of each regression.
+    '''
+
+    regressions = []
+
+    for name, position in report['positions'].items():
+        if name not in baseline['positions']:
+            continue
+
+        before = baseline['positions'][name]
+        latency = position['phases']['total']['p50']
+        baseline_latency = before['phases']['total']['p50']
+
+        if latency > baseline_latency * (1 + threshold) and latency - baseline_latency > MIN_REGRESSION:
+            regressions.append('%s: total p50 %.1fms, baseline %.1fms' % (
+                name,
+                latency * 1000,
+                baseline_latency * 1000
+            ))
+
+        if position['nodes'] > before['nodes'] * (1 + threshold):
+            regressions.append('%s: %d nodes expanded, baseline %d' % (
+                name,
+                position['nodes'],
+                before['nodes']
+            ))
+
+    return regressions
+
+def check_pruning(positions, k):
+    '''
+    Compares the pruned search for the k best moves of each position with the
+    first k moves of the exhaustive search, which must be the same.
+
+    Parameter {Array<dict>} positions the positions to search.
+    Parameter {int} k the number of best moves to search for.
+    Returns {Array<str>} a description of each position whose moves differ.
+    '''
+
+    mismatches = []
+
+    for position in positions:
+        json_data = {'gameLetters': position['gameLetters'], 'userLetters': position['userLetters']}
+        pruned = best_game_move.compute_moves(json_data, k, workers=1)
+        exhaustive = best_game_move.compute_moves(json_data, None, workers=1)[:k]
+
+        if pruned != exhaustive:
+            mismatches.append('%s: pruned search found %s, exhaustive search found %s' % (
+                position['name'],
+                [(move['word'], move['score']) for move in pruned],
+                [(move['word'], move['score']) for move in exhaustive]
+            ))
+
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the move search.')
+    parser.add_argument('--repeat', type=int, default=3, help='the number of searches of each position')
+    parser.add_argument('--k', default='1', help='the number of best moves to search for, or all')
+    parser.add_argument('--save', action='store_true', help='save the report as the baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='the path of the baseline report')
+    parser.add_argument('--threshold', type=float, default=0.25, help='the allowed slowdown, as a fraction of the baseline')
+    parser.add_argument('--bound', type=float, help='the latency bound of a search, in seconds')
+    parser.add_argument('--json', help='a path to write the report to')
+    parser.add_argument('--check', action='store_true', help='check the pruned search finds the exhaustive search\'s best moves')
+    args = parser.parse_args()
+
+    k = None if args.k == 'all' else int(args.k)
+    report = benchmark(load_positions(), k, args.repeat)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+    if args.save:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+
+        print('\nSaved the baseline to %s' % args.baseline)
+        return
+
+    failed = False
+
+    for name, position in report['positions'].items():
+        if position['duplicates']:
+            print('FAIL: %s generated %d moves more than once' % (name, position['duplicates']))
+            failed = True
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        if baseline['k'] != k:
+            print('\nThe baseline searched for k=%s moves, not comparing.' % baseline['k'])
+        else:
+            regressions = find_regressions(report, baseline, args.threshold)
+
+            for regression in regressions:
+                print('REGRESSION %s' % regression)
+
+            failed = failed or bool(regressions)
+
+    if args.bound is not None and report['phases']['total']['max'] > args.bound:
+        print('FAIL: slowest search took %.3fs (bound %.3fs)' % (
+            report['phases']['total']['max'],
+            args.bound
+        ))
+        failed = True
+
+    if args.check and k is not None:
+        mismatches = check_pruning(load_positions(), k)
+
+        for mismatch in mismatches:
+            print('MISMATCH %s' % mismatch)
+
+        failed = failed or bool(mismatches)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -5,12 +5,16 @@
 
 'use strict';
 
-const {dest, parallel, src, watch} = require('gulp');
+const {dest, parallel, series, src, watch} = require('gulp');
+const {spawn} = require('child_process');
 const browserify = require('browserify');
 const source = require('vinyl-source-stream');
 const tsify = require('tsify');
 
-const build = parallel(copyPython, copyTxt, copyHtml, copyStyles, copyAssets, bundle);
+const build = series(
+    parallel(copyPython, copyTxt, copyHtml, copyStyles, copyAssets, bundle),
+    compileLexicon,
+);
 
 /**
  * Moves source python files into the distribution folder.
@@ -34,6 +38,17 @@ function copyTxt() {
       .pipe(dest('dist'));
 };
 
+/**
+ * Compiles the word list in the distribution folder into the memory mapped
+ * lexicon file used by the python backend.
+ *
+ * @return {ChildProcess} the compiler process so that the task will finish
+ * before moving to the next task.
+ */
+function compileLexicon() {
+  return spawn('python', ['dist/dictionary.py'], {stdio: 'inherit'});
+};
+
 /**
  * Moves source html files into the distribution folder.
  *
@@ -4,12 +4,299 @@ Emails: elijahsawyers@gmail.com
 Date: 03/28/2020
 '''
 
-from flask import (Flask, request, render_template, jsonify)
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import (Flask, Response, request, render_template, jsonify)
 
 import best_game_move
+import dictionary
+import game_session
+import metrics
+import profiling
+import serving
+from cancellation import CancellationToken
 
 app = Flask(__name__)
 
+# The number of seconds a search may take before the best move found so far is
+# returned. It can be set with the WWF_SEARCH_BUDGET environment variable (zero
+# for no limit).
+SEARCH_BUDGET = float(os.environ.get('WWF_SEARCH_BUDGET', '5'))
+
+# The cancellation token of the running search of each client, so a new request
+# from a client cancels the search it supersedes.
+ACTIVE_SEARCHES = {}
+ACTIVE_SEARCHES_LOCK = threading.Lock()
+
+# Whether every search is instrumented, and its counters observed in the
+# /metrics histograms. It can be set with the WWF_METRICS environment variable
+# (searches are a little slower when instrumented). Requests asking for the
+# debug field are always instrumented.
+METRICS_ENABLED = os.environ.get('WWF_METRICS', '0') == '1'
+
+# The histograms exposed at /metrics.
+REQUEST_SECONDS = metrics.Histogram(
+    'wwf_request_seconds',
+    'Seconds taken to answer a move request.',
+    metrics.SECONDS_BUCKETS,
+    'endpoint'
+)
+PHASE_SECONDS = metrics.Histogram(
+    'wwf_search_phase_seconds',
+    'Seconds spent in each phase of a search.',
+    metrics.SECONDS_BUCKETS,
+    'phase'
+)
+SEARCH_COUNTS = metrics.Histogram(
+    'wwf_search_work',
+    'Work done by a search: anchors searched, nodes expanded, dictionary probes, words scored, duplicate words and candidate moves.',
+    metrics.COUNT_BUCKETS,
+    'counter'
+)
+QUEUE_WAIT_SECONDS = metrics.Histogram(
+    'wwf_queue_wait_seconds',
+    'Seconds a search waited for a serving pool worker.',
+    metrics.SECONDS_BUCKETS
+)
+EXEC_SECONDS = metrics.Histogram(
+    'wwf_exec_seconds',
+    'Seconds a search ran, in the request thread or on a serving pool worker.',
+    metrics.SECONDS_BUCKETS
+)
+HISTOGRAMS = [REQUEST_SECONDS, QUEUE_WAIT_SECONDS, EXEC_SECONDS, PHASE_SECONDS, SEARCH_COUNTS]
+
+# The counters of the caches, exposed at /metrics. With serving workers, these
+# are the caches of the server process (the workers' caches aren't exposed).
+CACHE_METRICS = metrics.CacheMetrics(
+    'wwf_cache',
+    {
+        'result': best_game_move.RESULT_CACHE,
+        'cross_check': best_game_move.CROSS_CHECK_CACHE
+    }
+)
+
+# The pool of worker processes searches run on, if the serving mode is enabled
+# (see serving.SERVING_WORKERS). It's started on the first search, so each
+# server process forked by server.py gets its own.
+SERVING_POOL = None
+SERVING_POOL_LOCK = threading.Lock()
+
+def get_serving_pool():
+    '''
+    Returns {ServingPool} the serving pool of this process, or None if the
+    serving mode isn't enabled.
+    '''
+
+    global SERVING_POOL
+
+    if not serving.SERVING_WORKERS:
+        return None
+
+    with SERVING_POOL_LOCK:
+        if SERVING_POOL is None:
+            SERVING_POOL = serving.ServingPool(serving.SERVING_WORKERS, serving.SERVING_QUEUE_DEPTH)
+
+        return SERVING_POOL
+
+def request_data():
+    '''
+    Reads the position of a request: JSON data, with the game board as game
+    letters (gameLetters) or in the compact encoding (board), and the rack as
+    a list of letters (userLetters) or a string (rack); or a binary body
+    (application/octet-stream) of the 225 cells of the game board, followed by
+    the rack, with the gameId (if any) in the query string.
+
+    Returns {dict} the request data.
+    Raises {ValueError} if the compact game board or rack isn't valid.
+    '''
+
+    if request.mimetype == 'application/octet-stream':
+        body = request.get_data()
+        json_data = {'board': body[:225].decode('latin-1'), 'rack': body[225:].decode('latin-1')}
+
+        if request.args.get('gameId') is not None:
+            json_data['gameId'] = request.args['gameId']
+    else:
+        json_data = request.json
+
+    validate_position(json_data)
+
+    return json_data
+
+def validate_position(json_data):
+    '''
+    Parameter {dict} json_data request data with a position.
+    Raises {ValueError} if the position's compact game board, its game letters'
+    (or delta's) indices, or its rack isn't valid, or it has neither form of
+    the rack.
+    '''
+
+    if not isinstance(json_data, dict):
+        raise ValueError('Send a position.')
+
+    if 'board' in json_data:
+        if not isinstance(json_data['board'], (str, bytes)):
+            raise ValueError('A game board must be a string.')
+
+        best_game_move.decode_game_board(json_data['board'])
+
+    for key in ('gameLetters', 'delta'):
+        if isinstance(json_data.get(key), list):
+            for letter in json_data[key]:
+                best_game_move.game_letter_index(letter)
+
+    if not isinstance(json_data.get('rack'), str) and not isinstance(json_data.get('userLetters'), list):
+        raise ValueError('Send the rack as a string (rack), or a list of letters (userLetters).')
+
+def parse_k(default):
+    '''
+    Parameter {str} default the value of k if the k query parameter isn't given.
+    Returns {int} the number of moves asked for by the k query parameter, or
+    None for every move ("all").
+    Raises {ValueError} if k isn't a positive integer, or "all".
+    '''
+
+    k = request.args.get('k', default)
+
+    if k == 'all':
+        return None
+
+    if not k.isdigit() or int(k) < 1:
+        raise ValueError(k)
+
+    return int(k)
+
+def wants_debug(json_data):
+    '''
+    Parameter {dict} json_data request data with an optional debug flag.
+    Returns {bool} whether the request asks for the search's counters, with a
+    debug field in its data or a debug query parameter.
+    '''
+
+    return bool(json_data.get('debug')) or request.args.get('debug') in ('1', 'true')
+
+def wants_profile():
+    '''
+    Returns {bool} whether the request asks to be profiled, with an X-Profile: 1
+    header (it's only profiled if profiling is enabled, see profiling.PROFILE_DIR).
+    '''
+
+    return request.headers.get(profiling.PROFILE_HEADER) in ('1', 'true')
+
+def observe_search(stats):
+    '''
+    Adds the counters of an instrumented search to the /metrics histograms.
+    Searches answered from the result cache did no work (and searches dropped
+    before they started did none either), so they're left out.
+
+    Parameter {dict} stats the counters of the search (see best_game_move.SEARCH_COUNTERS).
+    '''
+
+    if not stats or stats.get('cached'):
+        return
+
+    for counter in best_game_move.SEARCH_COUNTERS:
+        if counter.endswith('_seconds'):
+            PHASE_SECONDS.observe(stats[counter], counter[:-len('_seconds')])
+        else:
+            SEARCH_COUNTS.observe(stats[counter], counter)
+
+@contextmanager
+def search_token(json_data):
+    '''
+    Makes the cancellation token of a request's search, with the search budget,
+    and cancels the running search of the same client, if any (on the serving
+    pool, the token sets the search's cancel flag, which stops its worker). A
+    client is known by its gameId, or its X-Client-Id header; searches of other
+    requests aren't cancelled.
+
+    Parameter {dict} json_data request data with an optional gameId.
+    Yields {CancellationToken} the cancellation token of the search.
+    '''
+
+    token = CancellationToken(SEARCH_BUDGET or None)
+
+    if json_data.get('gameId') is not None:
+        client = ('game', json_data['gameId'])
+    elif request.headers.get('X-Client-Id'):
+        client = ('client', request.headers['X-Client-Id'])
+    else:
+        yield token
+        return
+
+    with ACTIVE_SEARCHES_LOCK:
+        if client in ACTIVE_SEARCHES:
+            ACTIVE_SEARCHES[client].cancel()
+
+        ACTIVE_SEARCHES[client] = token
+
+    try:
+        yield token
+    finally:
+        with ACTIVE_SEARCHES_LOCK:
+            if ACTIVE_SEARCHES.get(client) is token:
+                del ACTIVE_SEARCHES[client]
+
+def search_moves(json_data, k, name, token, stats):
+    '''
+    Runs the search of a request, after bringing its game session (if any) up
+    to date: in the request thread, or on the serving pool, if there is one.
+    The time the search waited for a worker and the time it ran are recorded.
+
+    Parameter {dict} json_data the request data.
+    Parameter {int} k the number of moves to search for, or None for every move.
+    Parameter {str} name the name of the endpoint.
+    Parameter {CancellationToken} token the token to cancel the search with.
+    Parameter {dict} stats counters to add the work of the search to, if any.
+    Returns {tuple} the moves, best first, and the Server-Timing header of the
+    response, with the milliseconds the search waited (queue) and ran (exec).
+    Raises {UnknownGameError} if a delta is sent for a game without a session.
+    Raises {QueueFullError} if the serving pool's queue is full.
+    '''
+
+    pool = get_serving_pool()
+
+    with game_session.open_session(json_data) as session:
+        if pool is None:
+            start = time.perf_counter()
+
+            with profiling.profile_request(json_data, name, wants_profile()):
+                moves = best_game_move.compute_moves(json_data, k, session, token=token, stats=stats)
+
+            exec_seconds = time.perf_counter() - start
+            EXEC_SECONDS.observe(exec_seconds)
+
+            return moves, 'exec;dur=%.1f' % (exec_seconds * 1000)
+
+        # The session can't be shared with the workers, so its board is sent.
+        position = serving.search_position(json_data, session)
+
+    # The worker profiles the search, if it's asked for or sampled.
+    result = pool.search(position, k, token, stats is not None, name, wants_profile())
+
+    if stats is not None and result['stats'] is not None:
+        stats.update(result['stats'])
+
+    QUEUE_WAIT_SECONDS.observe(result['wait_seconds'])
+    EXEC_SECONDS.observe(result['exec_seconds'])
+
+    return result['moves'], 'queue;dur=%.1f, exec;dur=%.1f' % (
+        result['wait_seconds'] * 1000,
+        result['exec_seconds'] * 1000
+    )
+
+def busy_response():
+    '''
+    Returns {tuple} the response to a request turned away because the serving
+    pool's queue is full.
+    '''
+
+    return jsonify({'error': 'The server is busy, try again later.'}), 503, {'Retry-After': str(serving.RETRY_AFTER)}
+
 @app.route('/')
 def index():
     '''
@@ -21,10 +308,208 @@ def index():
 @app.route('/bestGameMove', methods=['POST'])
 def compute_best_game_move():
     '''
-    Given gameboard data, return the best possible game move.
+    Given gameboard data, return the best possible game move. Requests with a
+    gameId keep the game board between calls, so they can send only the cells
+    that changed (delta) instead of the full game board (gameLetters or board).
+    '''
+
+    try:
+        json_data = request_data()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    start = time.perf_counter()
+    debug = wants_debug(json_data)
+    stats = {} if debug or METRICS_ENABLED else None
+
+    try:
+        with search_token(json_data) as token:
+            moves, server_timing = search_moves(json_data, 1, 'bestGameMove', token, stats)
+
+        move = best_game_move.best_move(moves)
+        move['partial'] = token.partial
+
+        if stats is not None:
+            observe_search(stats)
+
+        if debug:
+            move['debug'] = stats
+
+        return jsonify(move), 200, {
+            'X-Partial-Result': 'true' if token.partial else 'false',
+            'Server-Timing': server_timing
+        }
+    except game_session.UnknownGameError:
+        return jsonify({'error': 'Unknown gameId, send the full gameLetters or board.'}), 409
+    except serving.QueueFullError:
+        return busy_response()
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, 'bestGameMove')
+
+@app.route('/bestGameMoves', methods=['POST'])
+def compute_best_game_moves():
+    '''
+    Given gameboard data, return the k best possible game moves, where k is
+    given by the k query parameter (10 by default), or every possible game
+    move, if k is "all". With debug, the moves are returned with the search's
+    counters, as {moves, debug}.
+    '''
+
+    try:
+        k = parse_k('10')
+    except ValueError:
+        return jsonify({'error': 'k must be a positive integer, or all.'}), 400
+
+    try:
+        json_data = request_data()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    start = time.perf_counter()
+    debug = wants_debug(json_data)
+    stats = {} if debug or METRICS_ENABLED else None
+
+    try:
+        with search_token(json_data) as token:
+            moves, server_timing = search_moves(json_data, k, 'bestGameMoves', token, stats)
+
+        if stats is not None:
+            observe_search(stats)
+
+        if debug:
+            moves = {'moves': moves, 'debug': stats}
+
+        return jsonify(moves), 200, {
+            'X-Partial-Result': 'true' if token.partial else 'false',
+            'Server-Timing': server_timing
+        }
+    except game_session.UnknownGameError:
+        return jsonify({'error': 'Unknown gameId, send the full gameLetters or board.'}), 409
+    except serving.QueueFullError:
+        return busy_response()
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, 'bestGameMoves')
+
+@app.route('/bestGameMoves/batch', methods=['POST'])
+def compute_batch_game_moves():
+    '''
+    Given a list of positions (the game board, as gameLetters or a compact
+    board, the user's letter rack, and an optional id), stream the k best
+    moves of each one (k is 1 by default), as newline delimited JSON: one line
+    per position, with its id, moves and partial flag. Results are streamed in
+    the order of the positions, or as they complete with order=completed. The
+    positions are searched on the search pool (see
+    best_game_move.compute_batch), or on the serving pool in the serving mode
+    (where a batch is turned away with a 503 if its queue is full), each
+    within the search budget.
+    '''
+
+    try:
+        k = parse_k('1')
+    except ValueError:
+        return jsonify({'error': 'k must be a positive integer, or all.'}), 400
+
+    order = request.args.get('order', 'input')
+
+    if order not in ('input', 'completed'):
+        return jsonify({'error': 'order must be input or completed.'}), 400
+
+    positions = request.json
+
+    if isinstance(positions, dict):
+        positions = positions.get('positions')
+
+    if not isinstance(positions, list):
+        return jsonify({'error': 'Send a list of positions.'}), 400
+
+    for position in positions:
+        try:
+            validate_position(position)
+        except ValueError as error:
+            return jsonify({'error': str(error)}), 400
+
+        if 'board' not in position and not isinstance(position.get('gameLetters'), list):
+            return jsonify({'error': 'Send the game board of each position (gameLetters or board).'}), 400
+
+    pool = get_serving_pool()
+
+    # In the serving mode, the batch goes through the serving pool's queue.
+    if pool is not None:
+        try:
+            results = pool.search_batch(positions, k, ordered=order == 'input', budget=SEARCH_BUDGET or None)
+        except serving.QueueFullError:
+            return busy_response()
+    else:
+        results = best_game_move.compute_batch(
+            positions,
+            k,
+            ordered=order == 'input',
+            budget=SEARCH_BUDGET or None
+        )
+
+    response = Response(
+        (json.dumps(result) + '\n' for result in results),
+        mimetype='application/x-ndjson'
+    )
+
+    # Drop the positions still queued if the client goes away mid-stream.
+    response.call_on_close(results.close)
+
+    return response
+
+@app.route('/findWords')
+def find_words():
+    '''
+    Given a rack (the rack query parameter, '?' is a blank), and optionally
+    letters on the board the words can use (the board query parameter), list
+    the words that can be made, grouped by length and base score.
+    '''
+
+    rack = request.args.get('rack', '')
+    board_letters = request.args.get('board', '')
+    min_length = request.args.get('minLength', '2')
+
+    if not rack or len(rack) > 15 or rack.count('?') > 2:
+        return jsonify({'error': 'rack must be 1 to 15 letters, with at most 2 blanks (?).'}), 400
+
+    if len(board_letters) > 15:
+        return jsonify({'error': 'board must be at most 15 letters.'}), 400
+
+    if not min_length.isdigit():
+        return jsonify({'error': 'minLength must be a positive integer.'}), 400
+
+    return jsonify(dictionary.find_words(rack, board_letters, int(min_length)))
+
+@app.route('/matchWords')
+def match_words():
+    '''
+    Given a pattern (the pattern query parameter, with '?' or '.' for unknown
+    letters), and optionally a rack to fill its unknown letters from (the
+    rack query parameter, '?' is a blank), list the words that fit.
+    '''
+
+    pattern = request.args.get('pattern', '')
+    rack = request.args.get('rack')
+
+    if not pattern or len(pattern) > 15:
+        return jsonify({'error': 'pattern must be 1 to 15 letters and unknowns (? or .).'}), 400
+
+    if rack is not None and (not rack or len(rack) > 15 or rack.count('?') > 2):
+        return jsonify({'error': 'rack must be 1 to 15 letters, with at most 2 blanks (?).'}), 400
+
+    try:
+        return jsonify(dictionary.match_words(pattern, rack))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+@app.route('/metrics')
+def expose_metrics():
+    '''
+    Expose the request latency and search histograms, and the cache counters,
+    in the Prometheus text format.
     '''
 
-    return jsonify(best_game_move.compute(request.json))
+    return Response(metrics.render(HISTOGRAMS + [CACHE_METRICS]), mimetype='text/plain; version=0.0.4')
 
 # Run the web app.
 if __name__ == '__main__':
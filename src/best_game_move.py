@@ -5,9 +5,72 @@ Date: 03/27/2020
 Reference: Loosely based on https://www.cs.cmu.edu/afs/cs/academic/class/15451-s06/www/lectures/scrabble.pdf
 '''
 
-from dictionary import load_words
-
-DICTIONARY = load_words()
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from board import BORDER, CELL_INDICES, EMPTY, STRIDE, Board, cell_coordinates, cell_index
+from cache import LRUCache
+from cancellation import CancellationToken, SearchCancelled
+from dictionary import load_lexicon
+from move_collector import MoveCollector
+
+LEXICON = load_lexicon()
+
+# Results of recent searches, by board and rack. The size limit can be set with
+# the WWF_RESULT_CACHE_SIZE environment variable (zero disables the cache).
+RESULT_CACHE = LRUCache(int(os.environ.get('WWF_RESULT_CACHE_SIZE', '1024')))
+
+# The most moves a cached result can have, set with the
+# WWF_RESULT_CACHE_MAX_MOVES environment variable. Searches for more moves (or
+# every move) aren't cached, so each entry stays small.
+RESULT_CACHE_MAX_MOVES = int(os.environ.get('WWF_RESULT_CACHE_MAX_MOVES', '100'))
+
+# The cross checks of recent word fragments: the mask of letters that make a
+# word between the letters before and after a cell. The size limit can be set
+# with the WWF_CROSS_CHECK_CACHE_SIZE environment variable (zero disables the
+# cache).
+CROSS_CHECK_CACHE = LRUCache(int(os.environ.get('WWF_CROSS_CHECK_CACHE_SIZE', '65536')))
+
+# The number of worker processes searches are split across. It can be set with
+# the WWF_SEARCH_WORKERS environment variable (zero or one searches serially, in
+# the request thread).
+SEARCH_WORKERS = int(os.environ.get('WWF_SEARCH_WORKERS', '0'))
+
+# The process pools of parallel searches, by number of workers.
+SEARCH_POOLS = {}
+SEARCH_POOLS_LOCK = threading.Lock()
+
+# The number of search nodes between checks of a search's cancellation token
+# (reading the clock at every node would slow the search down), and the
+# seconds between checks while waiting on the workers of a parallel search.
+TOKEN_CHECK_INTERVAL = 256
+TOKEN_POLL_INTERVAL = 0.05
+
+# The counters of an instrumented search: the anchors searched, the search
+# nodes expanded, the lexicon edges followed (dictionary probes), the words
+# scored and offered to the collector, the words offered more than once
+# (duplicates, which the generators shouldn't produce), and the candidate
+# moves that made the collector's cut; and the seconds spent computing the
+# anchors, cross checks and cross sums, and generating the across and down
+# moves.
+SEARCH_COUNTERS = [
+    'anchors',
+    'nodes',
+    'probes',
+    'scored',
+    'duplicates',
+    'candidates',
+    'anchors_seconds',
+    'cross_checks_seconds',
+    'cross_sums_seconds',
+    'across_seconds',
+    'down_seconds'
+]
 
 ALPHABET = [
     'A',
@@ -38,6 +101,9 @@ ALPHABET = [
     'Z'
 ]
 
+# Cross check mask that allows every letter.
+ALL_LETTERS = (1 << 26) - 1
+
 LETTER_VALUES = {
     'A': 1,
     'B': 4,
@@ -68,6 +134,27 @@ LETTER_VALUES = {
     '?': 0
 }
 
+# Point values of tiles on the board. A blank is written as the (lowercase)
+# letter it's played as, and is worth nothing. Words are walked through the
+# lexicon with the letters uppercased, so a blank counts as its letter.
+TILE_VALUES = dict(LETTER_VALUES)
+for letter in ALPHABET:
+    TILE_VALUES[letter.lower()] = 0
+
+# The rack index of blank tiles (after the 26 letters), and its mask bit.
+BLANK = 26
+BLANK_MASK = 1 << BLANK
+
+# The tile choices of a cell are kept in a mask: bits 0-25 are the letters
+# played with a tile of that letter, and the bits from BLANK_CHOICES are the
+# letters played with a blank. Each bit maps to the alphabet index of the
+# letter, the rack index of the tile, the letter (lowercase for a blank), and
+# its points.
+BLANK_CHOICES = 27
+TILE_CHOICES = [(index, index, ALPHABET[index], LETTER_VALUES[ALPHABET[index]]) for index in range(26)]
+TILE_CHOICES.append(None)
+TILE_CHOICES += [(index, BLANK, ALPHABET[index].lower(), 0) for index in range(26)]
+
 GAME_BOARD_BONUSES = [
     ['  ', '  ', '  ', 'TW', '  ', '  ', 'TL', '  ', 'TL', '  ', '  ', 'TW', '  ', '  ', '  '],
     ['  ', '  ', 'DL', '  ', '  ', 'DW', '  ', '  ', '  ', 'DW', '  ', '  ', 'DL', '  ', '  '],
@@ -86,160 +173,283 @@ GAME_BOARD_BONUSES = [
     ['  ', '  ', '  ', 'TW', '  ', '  ', 'TL', '  ', 'TL', '  ', '  ', 'TW', '  ', '  ', '  '],
 ]
 
-def compute_across_cross_checks(game_board):
+# The letter and word multipliers of each cell, from the game board bonuses,
+# indexed like the cells of a board.
+LETTER_MULTIPLIERS = [1] * (STRIDE * STRIDE)
+WORD_MULTIPLIERS = [1] * (STRIDE * STRIDE)
+for bonus_row in range(15):
+    for bonus_column in range(15):
+        bonus = GAME_BOARD_BONUSES[bonus_row][bonus_column]
+        LETTER_MULTIPLIERS[cell_index(bonus_row, bonus_column)] = {'DL': 2, 'TL': 3}.get(bonus, 1)
+        WORD_MULTIPLIERS[cell_index(bonus_row, bonus_column)] = {'DW': 2, 'TW': 3}.get(bonus, 1)
+
+# The compact encoding of a game board maps '.' to an empty cell, and can only
+# have letters (lowercase for blanks) and empty cells.
+BOARD_ENCODING = bytes.maketrans(b'.', b' ')
+BOARD_CELLS = b' ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# The border cells between the rows of a board (the right border of a row, and
+# the left border of the next), and before the first row and after the last.
+BOARD_ROW_BORDER = bytes([BORDER]) * 2
+BOARD_EDGE = bytes([BORDER]) * (STRIDE - 1)
+
+# The move returned when there are no possible moves.
+NO_MOVE = {
+    'word': '',
+    'score': 0,
+    'direction': 'down'
+}
+
+def compute_cross_check(game_board, index):
     '''
-    Given the game board, this function determines which letters can fit in each
-    cell of a row and form a valid down word. This returns the letter matrix for
-    each row as to which characters are valid for each cell.
+    Given a view of the game board, this function determines which letters can
+    fit in a cell and form a valid cross word (across the view's direction).
 
-    Parameter {Array<Array<str>>} game_board the game board letter matrix.
-    Returns {Array<Array<str>>} the cross check letter matrix.
+    Parameter {Board} game_board the game board view.
+    Parameter {int} index the index of the cell.
+    Returns {int} a 26 bit mask of the cell's valid letters (bit 0 is 'A').
     '''
 
-    cross_checks = []
+    cells = game_board.cells
+    cross_step = game_board.cross_step
 
-    # Iterate over the rows.
-    for row in range(15):
-        row_cross_checks = [[], [], [], [], [], [], [], [], [], [], [], [], [], [], []]
+    # The cell isn't empty.
+    if cells[index] != EMPTY:
+        return letter_mask(game_board[index].upper())
 
-        for i in range(15): # Iterate over the columns.
-            # The cell isn't empty.
-            if game_board[row][i] != ' ':
-                row_cross_checks[i].append(game_board[row][i])
-                continue
+    # Find the cross words before and after the cell (if applicable).
+    word_before = ''
+    word_after = ''
+
+    k = index - cross_step
+    while cells[k] > BORDER:
+        word_before = game_board[k] + word_before
+        k -= cross_step
+
+    k = index + cross_step
+    while cells[k] > BORDER:
+        word_after = word_after + game_board[k]
+        k += cross_step
+
+    # No word before or after, so any letter fits.
+    if not word_before and not word_after:
+        return ALL_LETTERS
+
+    # Blanks on the board count as the letters they're played as.
+    word_before = word_before.upper()
+    word_after = word_after.upper()
+
+    # Find which (if any) letters in the alphabet form a valid cross word. The
+    # same fragments come up across cells, turns and games, so they're cached.
+    fragments = (word_before, word_after)
+    cross_check = CROSS_CHECK_CACHE.get(fragments)
+
+    if cross_check is None:
+        cross_check = LEXICON.completions(word_before, word_after)
+        CROSS_CHECK_CACHE.put(fragments, cross_check)
+
+    return cross_check
+
+def compute_cross_sum(game_board, index):
+    '''
+    Given a view of the game board, this function sums the points of the letters
+    before and after a cell across the view's direction, which are part of the
+    cross word formed by playing in the cell.
+
+    Parameter {Board} game_board the game board view.
+    Parameter {int} index the index of the cell.
+    Returns {int} the points of the letters before and after the cell, or -1 if
+    the cell isn't empty, or doesn't have letters before or after it.
+    '''
+
+    cells = game_board.cells
+    cross_step = game_board.cross_step
+
+    if cells[index] != EMPTY:
+        return -1
+
+    if cells[index - cross_step] <= BORDER and cells[index + cross_step] <= BORDER:
+        return -1
+
+    cross_sum = 0
+
+    k = index - cross_step
+    while cells[k] > BORDER:
+        cross_sum += TILE_VALUES[game_board[k]]
+        k -= cross_step
+
+    k = index + cross_step
+    while cells[k] > BORDER:
+        cross_sum += TILE_VALUES[game_board[k]]
+        k += cross_step
+
+    return cross_sum
+
+def compute_cross_checks(game_board):
+    '''
+    Given a view of the game board, this function determines which letters can
+    fit in each cell and form a valid cross word (see compute_cross_check).
+    Across words use the cross checks of the game board, and down words the
+    cross checks of its transposed view.
+
+    Parameter {Board} game_board the game board view.
+    Returns {Array<int>} the cross checks, indexed like the cells of the board,
+    where each cell is a 26 bit mask of its valid letters (bit 0 is 'A').
+    '''
+
+    cross_checks = [0] * (STRIDE * STRIDE)
+
+    for index in CELL_INDICES:
+        cross_checks[index] = compute_cross_check(game_board, index)
 
-            # Find the words above and below (if applicable).
-            word_above = ''
-            word_below = ''
-
-            j = row - 1
-            while j != -1 and game_board[j][i] != ' ':
-                word_above = game_board[j][i] + word_above
-                j -= 1
-
-            j = row + 1
-            while j != 15 and game_board[j][i] != ' ':
-                word_below =  word_below + game_board[j][i]
-                j += 1
-
-            # Find which (if any) letters in the alphabet form a valid cross word.
-            for letter in range(26):
-                # Word above and below.
-                if word_above and word_below:
-                    if (word_above + ALPHABET[letter] + word_below).lower() in DICTIONARY:
-                        row_cross_checks[i].append(ALPHABET[letter])
-                # Only word above.
-                elif word_above:
-                    if (word_above + ALPHABET[letter]).lower() in DICTIONARY:
-                        row_cross_checks[i].append(ALPHABET[letter])
-                # Only word below.
-                elif word_below:
-                    if (ALPHABET[letter] + word_below).lower() in DICTIONARY:
-                        row_cross_checks[i].append(ALPHABET[letter])
-                # No word above or below.
-                else:
-                    row_cross_checks[i].append(ALPHABET[letter])
-        
-        cross_checks.append(row_cross_checks)
-    
     return cross_checks
 
+def compute_cross_sums(game_board):
+    '''
+    Given a view of the game board, this function computes its scoring table:
+    the points of the cross word letters already on the board around each cell
+    (see compute_cross_sum).
 
-def compute_down_cross_checks(game_board):
+    Parameter {Board} game_board the game board view.
+    Returns {Array<int>} the cross sums, indexed like the cells of the board.
     '''
-    Given the game board, this function determines which letters can fit in each
-    cell of a column and form a valid across word. This returns the letter matrix for
-    each column as to which characters are valid for each cell.
 
-    Parameter {Array<Array<str>>} game_board the game board letter matrix.
-    Returns {Array<Array<str>>} the cross check letter matrix.
+    cross_sums = [-1] * (STRIDE * STRIDE)
+
+    for index in CELL_INDICES:
+        cross_sums[index] = compute_cross_sum(game_board, index)
+
+    return cross_sums
+
+def compute_score_bounds(game_board, cross_sums, rack):
+    '''
+    Given a view of the game board, and the user's letter rack, this function
+    computes upper bounds on the points the rest of a word can add, for each
+    cell the word can continue from, and each number of tiles left to play.
+    The rest of the word can only use the cells from there to the end of the
+    line, so it can't do better than: every letter on the board ahead, the
+    highest valued tiles on the best letter multipliers ahead, the best word
+    multipliers ahead, the best cross words ahead, and the full rack bonus if
+    enough cells are left for it.
+
+    Parameter {Board} game_board the game board view.
+    Parameter {Array<int>} cross_sums the cross sums of the view.
+    Parameter {Array<int>} rack the count of each letter (and blanks) on the rack.
+    Returns {Array<Array<tuple>>} indexed like the cells of the board, then by
+    the number of tiles left to play: the bound on the points of the rest of the
+    word's letters, the bound on its word multiplier, and the bound on the
+    points of the cross words and the full rack bonus.
     '''
 
-    cross_checks = []
+    cells = game_board.cells
+    step = game_board.step
+    cross_step = game_board.cross_step
+    tile_count = sum(rack)
+
+    # The points of the tiles on the rack, highest first (blanks are worth nothing).
+    tile_values = [0] * rack[BLANK]
+    for letter in range(26):
+        tile_values += [LETTER_VALUES[ALPHABET[letter]]] * rack[letter]
+    tile_values.sort(reverse=True)
+
+    highest_value = tile_values[0] if tile_values else 0
+
+    bounds = [None] * (STRIDE * STRIDE)
+
+    for line in range(15):
+        # Walk the line from its end, keeping the letter points, and the bonuses
+        # of the empty cells, from each cell to the end of the line.
+        letter_points = 0
+        letter_multipliers = []
+        word_multipliers = []
+        cross_points = []
+
+        index = (line + 1) * cross_step + 15 * step
+        while cells[index] != BORDER:
+            if cells[index] != EMPTY:
+                letter_points += TILE_VALUES[game_board[index]]
+            else:
+                letter_multipliers.append(LETTER_MULTIPLIERS[index])
+                letter_multipliers.sort(reverse=True)
+                word_multipliers.append(WORD_MULTIPLIERS[index])
+                word_multipliers.sort(reverse=True)
+
+                if cross_sums[index] != -1:
+                    cross_points.append(
+                        (cross_sums[index] + highest_value * LETTER_MULTIPLIERS[index]) *
+                        WORD_MULTIPLIERS[index]
+                    )
+                    cross_points.sort(reverse=True)
 
-    # Iterate over the columns.
-    for column in range(15):
-        column_cross_checks = [[], [], [], [], [], [], [], [], [], [], [], [], [], [], []]
+            letters_bound = letter_points
+            word_multiplier_bound = 1
+            cross_bound = 0
+            cell_bounds = [(letters_bound, word_multiplier_bound, cross_bound)]
 
-        for i in range(15): # Iterate over the rows.
-            # The cell isn't empty.
-            if game_board[i][column] != ' ':
-                column_cross_checks[i].append(game_board[i][column])
-                continue
+            for tiles in range(1, tile_count + 1):
+                if tiles <= len(letter_multipliers):
+                    letters_bound += tile_values[tiles - 1] * letter_multipliers[tiles - 1]
+                    word_multiplier_bound *= word_multipliers[tiles - 1]
+
+                if tiles <= len(cross_points):
+                    cross_bound += cross_points[tiles - 1]
 
-            # Find the words left and right (if applicable).
-            word_left = ''
-            word_right = ''
-
-            j = column - 1
-            while j != -1 and game_board[i][j] != ' ':
-                word_left = game_board[i][j] + word_left
-                j -= 1
-
-            j = column + 1
-            while j != 15 and game_board[i][j] != ' ':
-                word_right =  word_right + game_board[i][j]
-                j += 1
-
-            # Find which (if any) letters in the alphabet form a valid cross word.
-            for letter in range(26):
-                # Word left and right.
-                if word_left and word_right:
-                    if (word_left + ALPHABET[letter] + word_right).lower() in DICTIONARY:
-                        column_cross_checks[i].append(ALPHABET[letter])
-                # Only word left.
-                elif word_left:
-                    if (word_left + ALPHABET[letter]).lower() in DICTIONARY:
-                        column_cross_checks[i].append(ALPHABET[letter])
-                # Only word right.
-                elif word_right:
-                    if (ALPHABET[letter] + word_right).lower() in DICTIONARY:
-                        column_cross_checks[i].append(ALPHABET[letter])
-                # No word left or right.
+                # The full rack bonus is scored when 7 tiles are played: the
+                # tiles played before the cell, and the rest on the empty cells
+                # ahead (a rack can have more than 7 tiles).
+                bonus_tiles = 7 - (tile_count - tiles)
+
+                if 0 <= bonus_tiles <= len(letter_multipliers):
+                    cell_bounds.append((letters_bound, word_multiplier_bound, cross_bound + 35))
                 else:
-                    column_cross_checks[i].append(ALPHABET[letter])
-        
-        cross_checks.append(column_cross_checks)
-    
-    return cross_checks
+                    cell_bounds.append((letters_bound, word_multiplier_bound, cross_bound))
+
+            bounds[index] = cell_bounds
+            index -= step
+
+    return bounds
+
+def is_anchor(game_board, index):
+    '''
+    An anchor is defined an empty cell with an adjacent (horizontal or vertical)
+    non-empty cell.
+
+    Parameter {Board} game_board the game board.
+    Parameter {int} index the index of the cell.
+    Returns {int} one if the cell is an anchor, otherwise zero.
+    '''
+
+    cells = game_board.cells
+
+    if cells[index] == EMPTY:
+        if (
+            cells[index - 1] > BORDER or      # Letter to the left.
+            cells[index + 1] > BORDER or      # Letter to the right.
+            cells[index - STRIDE] > BORDER or # Letter above.
+            cells[index + STRIDE] > BORDER    # Letter below.
+        ):
+            return 1
+
+    return 0
 
 def compute_anchors(game_board):
     '''
     An anchor is defined an empty cell with an adjacent (horizontal or vertical)
-    non-empty cell. This returns the binary matrix, where a zero is a non-anchor
+    non-empty cell. This returns the binary array, where a zero is a non-anchor
     and a one is an anchor. If there are no anchors, indicating an empty game board,
-    index [7, 7] is set as the only anchor.
-
-    Parameter {Array<Array<str>>} game_board the game board letter matrix.
-    Returns {Array<Array<int>>} the anchor matrix.
-    '''
-
-    no_anchors = True
-    anchors = [[], [], [], [], [], [], [], [], [], [], [], [], [], [], []]
-
-    for i in range(15):
-        for j in range(15):
-            if game_board[i][j] == ' ':                     # Empty cell.
-                if j != 0 and game_board[i][j - 1] != ' ':  # Letter to the left.
-                    no_anchors = False
-                    anchors[i].append(1)
-                    continue
-                if j != 14 and game_board[i][j + 1] != ' ': # Letter to the right.
-                    no_anchors = False
-                    anchors[i].append(1)
-                    continue
-                if i != 0 and game_board[i - 1][j] != ' ':  # Letter above.
-                    no_anchors = False
-                    anchors[i].append(1)
-                    continue
-                if i != 14 and game_board[i + 1][j] != ' ': # Letter below.
-                    no_anchors = False
-                    anchors[i].append(1)
-                    continue
-            anchors[i].append(0)
-
-    if no_anchors:
-        anchors[7][7] = 1
+    the center cell is set as the only anchor.
+
+    Parameter {Board} game_board the game board.
+    Returns {bytearray} the anchors, indexed like the cells of the board.
+    '''
+
+    anchors = bytearray(STRIDE * STRIDE)
+
+    for index in CELL_INDICES:
+        anchors[index] = is_anchor(game_board, index)
+
+    if not any(anchors):
+        anchors[cell_index(7, 7)] = 1
 
     return anchors
 
@@ -250,589 +460,1031 @@ def populate_game_board(letters):
 
     Parameter {Array<dict>} letters the game letters with letter and index
     key-value pairs.
-    Returns {Array<Array<str>>} the 2d populated gameboard.
+    Returns {Board} the populated gameboard.
+    Raises {ValueError} if a letter's index isn't a cell of the game board.
     '''
 
-    game_board = []
-
-    # Create an empty 15x15 game board.
-    for i in range(15):
-        row = []
-
-        for i in range(15):
-            row += ' '
-        
-        game_board += [row]
+    game_board = Board()
 
     # Populate the letters given into the game board.
     for letter in letters:
-        i = int(letter['index'] / 15)
-        j = letter['index'] % 15
-        letter = letter['letter']
-
-        game_board[i][j] = letter
+        game_board[game_letter_index(letter)] = letter['letter']
 
     return game_board
 
-def intersection(lst1, lst2):
+def game_letter_index(letter):
     '''
-    Given two lists, return the values that are in both lists, i.e. the intersection.
+    Parameter {dict} letter a game letter with letter and index key-value pairs.
+    Returns {int} the index of the letter's cell in a board.
+    Raises {ValueError} if the letter's index isn't a cell of the 15x15 game board.
+    '''
+
+    index = letter['index']
+
+    if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < 225:
+        raise ValueError('A game letter\'s index must be a cell of the game board, from 0 to 224.')
 
-    Parameter {Array<any>} lst1 the first list.
-    Parameter {Array<any>} lst2 the second list.
-    Returns {Array}
+    return cell_index(index // 15, index % 15)
+
+def decode_game_board(board):
+    '''
+    Given a game board in the compact encoding, a string (or bytes) of the 225
+    cells row by row, with a letter (lowercase for a blank) or '.' (or ' ')
+    for an empty cell, create the 15x15 WWF game board. The board's cells are
+    joined straight from the rows, with the border between them.
+
+    Parameter {str|bytes} board the encoded game board.
+    Returns {Board} the populated gameboard.
+    Raises {ValueError} if the encoded game board isn't 225 valid cells.
+    '''
+
+    if isinstance(board, str):
+        board = board.encode('latin-1')
+
+    board = board.translate(BOARD_ENCODING)
+
+    if len(board) != 225 or board.translate(None, BOARD_CELLS):
+        raise ValueError('A game board must be 225 cells, each a letter (lowercase for a blank) or \'.\'.')
+
+    return Board(bytearray(BOARD_ROW_BORDER.join(
+        [BOARD_EDGE] +
+        [board[row * 15:row * 15 + 15] for row in range(15)] +
+        [BOARD_EDGE]
+    )))
+
+def worker_position(game_board, rack):
     '''
+    Parameter {Board} game_board the game board.
+    Parameter {Array<str>} rack the user's letters.
+    Returns {dict} the position to send to a worker process: the cells of the
+    game board as they are (with any tile a request can put on the board,
+    like a blank without a letter), and the rack.
+    '''
+
+    return {'cells': bytes(game_board.cells), 'rack': ''.join(rack)}
+
+def request_game_board(json_data):
+    '''
+    Parameter {dict} json_data request data with the game board, as game
+    letters (gameLetters) or in the compact encoding (board).
+    Returns {Board} the populated gameboard.
+    '''
+
+    # A worker process gets the cells of the game board (see worker_position).
+    if isinstance(json_data.get('cells'), bytes):
+        return Board(bytearray(json_data['cells']))
 
-    return [value for value in lst1 if value in lst2]
+    if 'board' in json_data:
+        return decode_game_board(json_data['board'])
 
-def compute(json_data):
+    return populate_game_board(json_data['gameLetters'])
+
+def request_rack(json_data):
+    '''
+    Parameter {dict} json_data request data with the user's letter rack, as a
+    list of letters (userLetters) or a string (rack).
+    Returns {Array<str>} the user's letters.
+    '''
+
+    if 'rack' in json_data:
+        return list(json_data['rack'])
+
+    return json_data['userLetters']
+
+def letter_mask(letter):
+    '''
+    Parameter {str} letter an uppercase letter.
+    Returns {int} the mask with the letter's bit set, or 0 if it isn't in the alphabet.
+    '''
+
+    index = ord(letter) - 65
+
+    if index < 0 or index > 25:
+        return 0
+
+    return 1 << index
+
+def rack_counts(letters):
+    '''
+    Given the user's letters, count how many of each letter are on the rack.
+
+    Parameter {Array<str>} letters the user's letter rack ('?' is a blank).
+    Returns {Array<int>} the count of each letter, indexed by alphabet index,
+    followed by the count of blanks.
+    '''
+
+    counts = [0] * 27
+
+    for letter in letters:
+        if letter == '?':
+            counts[BLANK] += 1
+        elif letter_mask(letter):
+            counts[ord(letter) - 65] += 1
+
+    return counts
+
+def counts_mask(counts):
+    '''
+    Parameter {Array<int>} counts the count of each letter (and blanks) on a rack.
+    Returns {int} the mask of letters (and blanks) with a non-zero count.
+    '''
+
+    mask = 0
+
+    for index in range(27):
+        if counts[index]:
+            mask |= 1 << index
+
+    return mask
+
+def playable_tiles(allowed_letters, rack_mask):
+    '''
+    Given the letters allowed in a cell, find the rack tiles that can be played
+    there. The rack is a multiset, so each distinct letter is a single choice,
+    however many copies of it are on the rack. A blank can be played as any
+    allowed letter, so blank expansion is limited to the letters that pass the
+    cross check and continue a word.
+
+    Parameter {int} allowed_letters the mask of letters allowed in the cell.
+    Parameter {int} rack_mask the mask of letters (and blanks) on the rack.
+    Returns {int} the mask of tile choices that can be played (see TILE_CHOICES).
+    '''
+
+    if rack_mask & BLANK_MASK:
+        return (allowed_letters & rack_mask) | (allowed_letters << BLANK_CHOICES)
+
+    return allowed_letters & rack_mask
+
+def compute(json_data, session=None, budget=None, token=None, debug=False):
     '''
     Given game board letters, and the user's letter rack, compute the best
     possible move.
 
     Parameter {dict} json_data request data with the game board letters and the
     user's letter rack.
-    Returns {dict} data containing the best possible move information.
+    Parameter {GameSession} session the game session of the request, if any.
+    Parameter {float} budget the number of seconds the search may take, if limited.
+    Parameter {CancellationToken} token a token to cancel the search with, if any.
+    Parameter {bool} debug whether to instrument the search, and return its
+    counters (see compute_moves) in the debug field of the move.
+    Returns {dict} data containing the best possible move information. If the
+    search was stopped before it was done, it's the best move found so far, and
+    partial is true.
     '''
 
-    # Populate the user's letter rack and the game board.
-    RACK = json_data['userLetters']
-    GAME_BOARD = populate_game_board(json_data['gameLetters'])
+    if token is None and budget is not None:
+        token = CancellationToken()
 
-    # Compute the anchors and cross checks.
-    anchors = compute_anchors(GAME_BOARD)
-    across_cross_checks = compute_across_cross_checks(GAME_BOARD)
-    down_cross_checks = compute_down_cross_checks(GAME_BOARD)
+    stats = {} if debug else None
+    move = best_move(compute_moves(json_data, 1, session, budget=budget, token=token, stats=stats))
+    move['partial'] = token is not None and token.partial
 
-    # Compute the highest scoring across word.
-    best_across_word = {
-        'last_letter_index': [-1, -1],
-        'word': '',
-        'score': 0,
-        'direction': 'across'
-    }
+    if debug:
+        move['debug'] = stats
 
-    def filter_rack(rack, letter):
-        '''
-        Removes a letter from the rack and returns it.
+    return move
 
-        Parameter {Array<str>} rack the rack of letters to filter.
-        Returns {Arrary<str>} the filtered rack.
-        '''
+def best_move(moves):
+    '''
+    Parameter {Array<dict>} moves the moves of a search, best first.
+    Returns {dict} the best move, or NO_MOVE if there are none.
+    '''
 
-        letter_removed = False
-        new_rack = []
+    if not moves:
+        return dict(NO_MOVE, last_letter_index=[-1, -1], tiles=[], blanks=[])
 
-        for current_letter in rack:
-            # Same letter, hasn't been removed.
-            if current_letter == letter and not letter_removed:
-                letter_removed = True
-            # Different letter or letter already removed, add it to the new rack.
-            else:
-                new_rack += current_letter
+    return moves[0]
 
-        return new_rack
+def compute_moves(json_data, k=None, session=None, on_move=None, workers=None, budget=None, token=None, stats=None):
+    '''
+    Given game board letters, and the user's letter rack, compute the k best
+    possible moves.
 
-    def score_word_across(word, last_index, rack_letter_indices):
-        '''
-        Given a word played across, compute it's score.
-
-        Parameter {str} word the word to compute the score of.
-        Parameter {list<int>} last_index the coordinates of the last letter
-        of the word on the board.
-        Parameter {list<int>} rack_letter_indices the indices of letters
-        played from the rack.
-        Returns {int} the score of the word.
-        '''
+    Parameter {dict} json_data request data with the game board letters and the
+    user's letter rack.
+    Parameter {int} k the number of moves to return, or None for every move.
+    Parameter {GameSession} session the game session of the request, if any.
+    Parameter {function} on_move called with each distinct move as it's found.
+    Results are cached (for k up to RESULT_CACHE_MAX_MOVES), unless moves are
+    streamed to on_move (which always searches serially).
+    Parameter {int} workers the number of worker processes to split the search
+    across, defaults to SEARCH_WORKERS.
+    Parameter {float} budget the number of seconds the search may take, if
+    limited (it sets the deadline of the token).
+    Parameter {CancellationToken} token a token to cancel the search with, if
+    any. If the search is stopped before it's done, the best moves found so far
+    are returned (and not cached), and the token is marked as partial.
+    Parameter {dict} stats counters to add the work of the search to, if any
+    (see SEARCH_COUNTERS), and whether the moves came from the result cache
+    ('cached').
+    Returns {Array<dict>} the moves, best first.
+    '''
 
-        # Extract the last letter index.
-        i, j = last_index
-
-        # Keep up with the number of double and triple word cells played.
-        dw = 0
-        tw = 0
-
-        # Compute the across word point value.
-        across_word_score = 0
-        for letter in word:
-            across_word_score += LETTER_VALUES[letter]
-
-        # Compute cross word point values.
-        cross_words_scores = []
-        for letter in word:
-            cross_words_scores.append(0)
-
-        for k in range(len(word)):
-            if [i, j - k] in rack_letter_indices:
-                if i != 0 and GAME_BOARD[i - 1][j - k] != ' ':
-                    l = i - 1
-                    while l > -1 and GAME_BOARD[l][j - k] != ' ':
-                        cross_words_scores[k] += LETTER_VALUES[GAME_BOARD[l][j - k]]
-                        l -= 1
-                if i != 14 and GAME_BOARD[i + 1][j - k] != ' ':
-                    l = i + 1
-                    while l < 15 and GAME_BOARD[l][j - k] != ' ':
-                        cross_words_scores[k] += LETTER_VALUES[GAME_BOARD[l][j - k]]
-                        l += 1
-                
-                if (
-                    i != 0 and GAME_BOARD[i - 1][j - k] != ' ' or
-                    i != 14 and GAME_BOARD[i + 1][j - k] != ' '
-                ):
-                    cross_words_scores[k] += LETTER_VALUES[word[len(word) - k - 1]]
-
-                # Compute bonus scores.
-                # Double Letter.
-                if GAME_BOARD_BONUSES[i][j - k] == 'DL':
-                    across_word_score += LETTER_VALUES[word[len(word) - k - 1]]
-
-                    if (
-                        i != 0 and GAME_BOARD[i - 1][j - k] != ' ' or
-                        i != 14 and GAME_BOARD[i + 1][j - k] != ' '
-                    ):
-                        cross_words_scores[k] += LETTER_VALUES[word[len(word) - k - 1]]
-                # Triple Letter.
-                elif GAME_BOARD_BONUSES[i][j - k] == 'TL':
-                    across_word_score += LETTER_VALUES[word[len(word) - k - 1]] * 2
-
-                    if (
-                        i != 0 and GAME_BOARD[i - 1][j - k] != ' ' or
-                        i != 14 and GAME_BOARD[i + 1][j - k] != ' '
-                    ):
-                        cross_words_scores[k] += LETTER_VALUES[word[len(word) - k - 1]] * 2
-                # Double Word.
-                elif GAME_BOARD_BONUSES[i][j - k] == 'DW':
-                    dw += 1
-
-                    cross_words_scores[k] *= 2
-                # Triple Word.
-                elif GAME_BOARD_BONUSES[i][j - k] == 'TW':
-                    tw += 1
-
-                    cross_words_scores[k] *= 3
-
-        # Factor in double and triple words for the across word.
-        for k in range(dw):
-            across_word_score *= 2
-
-        for k in range(tw):
-            across_word_score *= 3
-
-        # If the full rack is played, add 35 to the across word score.
-        if len(rack_letter_indices) == 7:
-            across_word_score += 35
-
-        # Add cross word values to the across word value, and return it.
-        for score in cross_words_scores:
-            across_word_score += score
-
-        return across_word_score
-
-    def extend_right(index, rack, current_word, rack_played_incides):
-        '''
-        Given an anchor position, recursively compute possible across word plays by
-        extending right on the board. For each word, compute its point value, and update
-        the best_across_word score accordingly.
-
-        Parameter {Array<int>} index the i, j index of the current position on the board.
-        Parameter {Array<str>} rack the user's letter rack.
-        Parameter {str} current_word the current permutation of the word.
-        Parameter {Array<Array<int>>} rack_played_incides a list of the indices of letters played
-        from the rack while extending right. 
-        '''
+    if budget is not None:
+        if token is None:
+            token = CancellationToken()
 
-        # Extract the gameboard coordinates.
-        i, j = index
+        token.set_budget(budget)
 
-        # Base Case - no common letters or out of the gameboard bounds.
-        if j > 14 or (GAME_BOARD[i][j] == ' ' and not intersection(rack, across_cross_checks[i][j])):
-            return
+    if on_move is not None:
+        collector = MoveCollector(k, on_move, count_duplicates=stats is not None)
+        generate_moves(json_data, collector, session, token=token, stats=stats)
 
-        # For the current coordinate, find common letters between the rack and cross checks.
-        common_letters = intersection(rack, across_cross_checks[i][j])
+        return collector.moves()
 
-        # Case 1: empty cell.
-        if GAME_BOARD[i][j] == ' ':
-            for letter in common_letters:
-                # Score the current word, if it's in the dictionary.
-                if (current_word + letter).lower() in DICTIONARY:
-                    if (j + 1 < 15 and GAME_BOARD[i][j + 1] == ' ') or j == 14:
-                        word = current_word + letter
-                        score = score_word_across(word, [i, j], rack_played_incides + [[i, j]])
-
-                        # Update the best across word, if the score of the current word is better.
-                        if score > best_across_word['score']:
-                            best_across_word['last_letter_index'] = [i, j]
-                            best_across_word['word'] = word
-                            best_across_word['score'] = score
-                
-                # Keep extending right to form words.
-                extend_right(
-                    [i, j + 1],
-                    filter_rack(rack, letter),
-                    current_word + letter,
-                    rack_played_incides + [[i, j]]
-                )
+    cacheable = k is not None and k <= RESULT_CACHE_MAX_MOVES
+    key = None
+    cached_moves = None
 
-        # Case 2: occupied cell.
-        else:
-            # Score the current word, if it's in the dictionary.
-            if (current_word + GAME_BOARD[i][j]).lower() in DICTIONARY:
-                if (j + 1 < 15 and GAME_BOARD[i][j + 1] == ' ') or j == 14:
-                    word = current_word + GAME_BOARD[i][j]
-                    score = score_word_across(word, [i, j], rack_played_incides)
-
-                    # Update the best across word, if the score of the current word is better.
-                    if score > best_across_word['score']:
-                        best_across_word['last_letter_index'] = [i, j]
-                        best_across_word['word'] = word
-                        best_across_word['score'] = score
-
-            # Keep extending right to form words.
-            extend_right(
-                [i, j + 1],
-                rack,
-                current_word + GAME_BOARD[i][j],
-                rack_played_incides
-            )
+    if cacheable:
+        key = result_cache_key(json_data, k, session)
+        cached_moves = RESULT_CACHE.get(key)
 
-    def extend_right_with_left_part(index, rack, left_part):
-        '''
-        Given a position to the left of an anchor, recursively compute possible across word
-        plays by extending left before extending right on the board. For each word, compute 
-        its point value, and update he best_across_word score accordingly.
+    if stats is not None:
+        stats['cached'] = cached_moves is not None
 
-        Parameter {Array<int>} index the i, j index of the current position on the board.
-        Parameter {Array<str>} rack the user's letter rack.
-        Parameter {str} left_part the current left_part of the word.
-        '''
+    # The moves are cached serialized, so callers get their own copy of them,
+    # and can't change the cached moves.
+    if cached_moves is not None:
+        return json.loads(cached_moves)
 
-        # Extract the gameboard coordinates.
-        i, j = index
+    if workers is None:
+        workers = SEARCH_WORKERS
 
-        # Base Case - no common letters or out of the gameboard bounds.
-        if j < 0 or not intersection(rack, across_cross_checks[i][j]):
-            return
+    collector = MoveCollector(k, count_duplicates=stats is not None)
 
-        # For the current coordinate, find common letters between the rack and cross checks.
-        common_letters = intersection(rack, across_cross_checks[i][j])
+    if workers > 1:
+        generate_moves_parallel(json_data, collector, session, workers, token, stats)
+    else:
+        generate_moves(json_data, collector, session, token=token, stats=stats)
 
-        # Case 1: the cell to the left of the current index is empty, or j = 0.
-        if j == 0 or GAME_BOARD[i][j - 1] == ' ':
-            for letter in common_letters:
-                word = letter + left_part
-                rack_played_incides = []
+    moves = collector.moves()
 
-                for k in range(len(word)):
-                    rack_played_incides += [[i, j + k]]
+    if cacheable and (token is None or not token.partial):
+        RESULT_CACHE.put(key, json.dumps(moves))
 
-                # Extend right to form words.
-                extend_right(
-                    [i, j + len(word)],
-                    filter_rack(rack, letter),
-                    word,
-                    rack_played_incides
-                )
+    return moves
 
-                # Keep extending left.
-                extend_right_with_left_part(
-                    [i, j - 1],
-                    filter_rack(rack, letter),
-                    word
-                )
-        # Case 2: the cell to the left of the current index is occupied.
-        else:
-            pass
-
-    for i in range(15):
-        for j in range(15):
-            if anchors[i][j]:
-                # Case 1: cell to the left of the anchor is empty.
-                if j != 0 and GAME_BOARD[i][j - 1] == ' ':
-                    extend_right(
-                        [i, j],
-                        RACK,
-                        '',
-                        []
-                    )
+def result_cache_key(json_data, k, session=None):
+    '''
+    Builds the result cache key of a search: a hash of the game board, the
+    sorted rack, and the number of moves, so neither the order of the rack nor
+    the order of the game letters matters.
 
-                    extend_right_with_left_part(
-                        [i, j - 1],
-                        RACK,
-                        ''
-                    )
-                # Case 2: cell to the left of the anchor is occupied.
-                else:
-                    # Grab the word to the left of the anchor, if there is one.
-                    word = ''
-                    k = j - 1
-                    while k != -1 and GAME_BOARD[i][k] != ' ':
-                        word = GAME_BOARD[i][k] + word
-                        k -= 1
-                    
-                    # Compute possible words extending right of the anchor.
-                    extend_right(
-                        [i, j],
-                        RACK,
-                        word,
-                        []
-                    )
+    Parameter {dict} json_data request data with the game board letters and the
+    user's letter rack.
+    Parameter {int} k the number of moves, or None for every move.
+    Parameter {GameSession} session the game session of the request, if any.
+    Returns {bytes} the cache key.
+    '''
+
+    if session is not None:
+        game_board = session.game_board
+    else:
+        game_board = request_game_board(json_data)
+
+    key = hashlib.sha1(game_board.cells)
+
+    key.update(('|%s|%s' % (''.join(sorted(request_rack(json_data))), k)).encode())
+
+    return key.digest()
+
+def compute_batch(positions, k=1, workers=None, ordered=True, budget=None):
+    '''
+    Compute the k best moves of many positions, on a pool of worker processes
+    which keep the lexicon loaded between positions, and yield each result as
+    soon as it can be: in the order of the positions, or in the order they
+    complete. Only a few positions per worker are queued at a time, so results
+    start streaming right away however many positions there are.
+
+    Parameter {iterable<dict>} positions the positions, each with the game board
+    letters, the user's letter rack, and an optional id.
+    Parameter {int} k the number of moves of each position, or None for every move.
+    Parameter {int} workers the number of worker processes, defaults to
+    SEARCH_WORKERS, or the number of CPUs if that's not set. With one worker,
+    the positions are searched in this process.
+    Parameter {bool} ordered whether to yield the results in the order of the
+    positions (otherwise, in the order they complete).
+    Parameter {float} budget the number of seconds the search of each position
+    may take, if limited.
+    Yields {dict} the result of each position: its id (its index in positions,
+    if it has none), its moves (best first), and whether its search was
+    stopped before it was done (partial).
+    '''
+
+    if workers is None:
+        workers = SEARCH_WORKERS or os.cpu_count() or 1
+
+    positions = (
+        (position.get('id', index), position)
+        for index, position in enumerate(positions)
+    )
+
+    # Case 1: search the positions in this process.
+    if workers <= 1:
+        for position_id, position in positions:
+            yield search_position(position_id, position, k, budget)
+        return
+
+    # Case 2: search the positions on the worker pool, keeping a few of them
+    # queued per worker.
+    pool = get_search_pool(workers)
+    max_pending = workers * 2
+    pending = collections.deque()
+
+    # The positions still queued when the generator is closed (e.g. the client
+    # went away) are dropped.
+    try:
+        for position_id, position in positions:
+            pending.append(pool.submit(search_position, position_id, position, k, budget))
+
+            if len(pending) >= max_pending:
+                yield from next_batch_results(pending, ordered)
+
+        while pending:
+            yield from next_batch_results(pending, ordered)
+    finally:
+        for future in pending:
+            future.cancel()
+
+def next_batch_results(pending, ordered):
+    '''
+    Waits for the next results of a batch, and takes their futures off the queue.
+
+    Parameter {deque<Future>} pending the futures of the queued positions, in order.
+    Parameter {bool} ordered whether to wait for the first position of the queue
+    (otherwise, for whichever positions complete first).
+    Returns {Array<dict>} the results (see search_position).
+    '''
+
+    if ordered:
+        return [pending.popleft().result()]
+
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+    for future in done:
+        pending.remove(future)
 
-    # Compute the highest scoring down word.
-    best_down_word = {
-        'last_letter_index': [-1, -1],
-        'word': '',
-        'score': 0,
-        'direction': 'down'
+    return [future.result() for future in done]
+
+def search_position(position_id, json_data, k, budget=None, instrument=False, token=None):
+    '''
+    Runs in a worker process (or in this process, for a batch without
+    workers): computes the k best moves of a position, of a batch or of a
+    request on the serving pool.
+
+    Parameter {any} position_id the id of the position.
+    Parameter {dict} json_data the position, with the game board letters and the
+    user's letter rack.
+    Parameter {int} k the number of moves, or None for every move.
+    Parameter {float} budget the number of seconds the search may take, from
+    when it starts, if limited.
+    Parameter {bool} instrument whether to count the work of the search.
+    Parameter {CancellationToken} token the token to cancel the search with, if any.
+    Returns {dict} the id, moves and partial flag of the position (see
+    compute_batch), and its counters (stats) if it's instrumented.
+    '''
+
+    if token is None and budget is not None:
+        token = CancellationToken()
+
+    stats = {} if instrument else None
+    moves = compute_moves(json_data, k, workers=1, budget=budget, token=token, stats=stats)
+    result = {
+        'id': position_id,
+        'moves': moves,
+        'partial': token is not None and token.partial
     }
 
-    def score_word_down(word, last_index, rack_letter_indices):
-        '''
-        Given a word played down, compute it's score.
-
-        Parameter {str} word the word to compute the score of.
-        Parameter {list<int>} last_index the coordinates of the last letter
-        of the word on the board.
-        Parameter {list<int>} rack_letter_indices the indices of letters
-        played from the rack.
-        Returns {int} the score of the word.
+    if instrument:
+        result['stats'] = stats
+
+    return result
+
+def partition_lines(anchors, partitions):
+    '''
+    Split the rows (for across words) and columns (for down words) of the game
+    board into partitions of about the same amount of work, going by their
+    number of anchors. Lines without anchors have no moves, so they're left out.
+
+    Parameter {bytearray} anchors the anchors of the game board.
+    Parameter {int} partitions the number of partitions.
+    Returns {Array<dict>} the non-empty partitions, each with the 'across' rows
+    and 'down' columns in it.
+    '''
+
+    lines = []
+
+    for line in range(15):
+        lines.append([sum(anchors[cell_index(line, k)] for k in range(15)), 'across', line])
+        lines.append([sum(anchors[cell_index(k, line)] for k in range(15)), 'down', line])
+
+    # Give the busiest line left to the partition with the least work so far.
+    lines.sort(key=lambda line: -line[0])
+    work = [0] * partitions
+    split = [{'across': [], 'down': []} for _ in range(partitions)]
+
+    for count, direction, line in lines:
+        if count:
+            partition = work.index(min(work))
+            work[partition] += count
+            split[partition][direction].append(line)
+
+    return [partition for partition in split if partition['across'] or partition['down']]
+
+def get_search_pool(workers):
+    '''
+    Parameter {int} workers the number of worker processes.
+    Returns {ProcessPoolExecutor} the (shared) process pool with that many workers.
+    '''
+
+    with SEARCH_POOLS_LOCK:
+        if workers not in SEARCH_POOLS:
+            SEARCH_POOLS[workers] = ProcessPoolExecutor(max_workers=workers)
+
+        return SEARCH_POOLS[workers]
+
+def search_partition(json_data, limit, lines, deadline, instrument=False):
+    '''
+    Runs in a search pool worker, which keeps the lexicon loaded between
+    searches: generates the moves of a partition of the game board.
+
+    Parameter {dict} json_data request data with the game board letters and the
+    user's letter rack.
+    Parameter {int} limit the number of moves to keep, or None for every move.
+    Parameter {dict} lines the 'across' rows and 'down' columns of the partition.
+    Parameter {float} deadline the time.monotonic() time the search must stop
+    at (the clock is shared by the processes of a machine), or None.
+    Parameter {bool} instrument whether to count the work of the search.
+    Returns {tuple} the rank and move data of each move kept, whether the
+    search ran out of time before it was done, and the search's counters (or
+    None, if it wasn't instrumented).
+    '''
+
+    token = None
+    stats = {} if instrument else None
+
+    if deadline is not None:
+        token = CancellationToken()
+        token.deadline = deadline
+
+    collector = MoveCollector(limit, count_duplicates=instrument)
+    generate_moves(json_data, collector, lines=lines, token=token, stats=stats)
+
+    return collector.ranked_moves(), token is not None and token.partial, stats
+
+def generate_moves_parallel(json_data, collector, session, workers, token=None, stats=None):
+    '''
+    Given game board letters, and the user's letter rack, generate every
+    possible move across a pool of worker processes, and offer the best moves
+    of each worker to the collector. The rows and columns of the board are
+    independent, so each worker searches a partition of them.
+
+    Parameter {dict} json_data request data with the game board letters and the
+    user's letter rack.
+    Parameter {MoveCollector} collector the collector to offer moves to.
+    Parameter {GameSession} session the game session of the request, if any.
+    Parameter {int} workers the number of worker processes.
+    Parameter {CancellationToken} token the token to cancel the search with, if
+    any. The workers stop at its deadline themselves, and send the best moves
+    they found so far. Once it's cancelled, the moves of the workers that
+    haven't finished are given up on.
+    Parameter {dict} stats counters to add the work of the workers to, if any
+    (see SEARCH_COUNTERS). The seconds are summed over the workers.
+    '''
+
+    if session is not None:
+        game_board = session.game_board
+        anchors = session.anchors
+    else:
+        game_board = request_game_board(json_data)
+        anchors = compute_anchors(game_board)
+
+    # The workers don't share the game session, so they get the full game board.
+    search_data = worker_position(game_board, request_rack(json_data))
+
+    deadline = None if token is None else token.deadline
+
+    pool = get_search_pool(workers)
+    pending = set(
+        pool.submit(search_partition, search_data, collector.limit, lines, deadline, stats is not None)
+        for lines in partition_lines(anchors, workers)
+    )
+
+    while pending:
+        done, pending = wait(
+            pending,
+            timeout=None if token is None else TOKEN_POLL_INTERVAL,
+            return_when=FIRST_COMPLETED
+        )
+
+        for future in done:
+            ranked_moves, partial, worker_stats = future.result()
+            collector.merge(ranked_moves)
+
+            if stats is not None:
+                for counter in SEARCH_COUNTERS:
+                    stats[counter] = stats.get(counter, 0) + worker_stats[counter]
+
+            if partial:
+                token.partial = True
+
+        if pending and token is not None and token.cancelled:
+            for future in pending:
+                future.cancel()
+
+            token.partial = True
+            return
+
+def generate_moves(json_data, collector, session=None, lines=None, token=None, stats=None):
+    '''
+    Given game board letters, and the user's letter rack, generate every
+    possible move, and offer each one to the collector.
+
+    Parameter {dict} json_data request data with the game board letters and the
+    user's letter rack.
+    Parameter {MoveCollector} collector the collector to offer moves to.
+    Parameter {GameSession} session the game session holding the game board,
+    anchors, cross checks and cross sums, if the request is part of one. When
+    given, the board letters in json_data are ignored.
+    Parameter {dict} lines the 'across' rows and 'down' columns to generate
+    moves in, defaults to all of them.
+    Parameter {CancellationToken} token the token to cancel the search with, if
+    any. When it says to stop, the search stops where it is, and the token is
+    marked as partial.
+    Parameter {dict} stats counters to add the work of the search to, if any
+    (see SEARCH_COUNTERS). Without it, the search isn't instrumented.
+    '''
+
+    if stats is not None:
+        for counter in SEARCH_COUNTERS:
+            stats.setdefault(counter, 0)
+
+        offered = collector.offered
+        duplicates = collector.duplicates
+        kept = collector.kept
+
+    # Populate the user's letter rack. The rack is kept as a multiset: a count
+    # of each letter, which the generators take letters from (and put them back)
+    # as they go, and a mask of the letters with copies left. Duplicate tiles
+    # don't fork identical subtrees, since a letter is tried once per cell.
+    RACK = rack_counts(request_rack(json_data))
+    RACK_MASK = counts_mask(RACK)
+
+    # Use the game session's board, anchors and cross checks, if there is one.
+    if session is not None:
+        GAME_BOARD = session.game_board
+        anchors = session.anchors
+        across_cross_checks = session.across_cross_checks
+        down_cross_checks = session.down_cross_checks
+        across_cross_sums = session.across_cross_sums
+        down_cross_sums = session.down_cross_sums
+    # Otherwise, populate the game board, and compute the anchors, cross checks,
+    # and the cross sums used for scoring.
+    else:
+        GAME_BOARD = request_game_board(json_data)
+
+        start = time.perf_counter()
+        anchors = compute_anchors(GAME_BOARD)
+        anchors_time = time.perf_counter()
+        across_cross_checks = compute_cross_checks(GAME_BOARD)
+        down_cross_checks = compute_cross_checks(GAME_BOARD.transposed())
+        cross_checks_time = time.perf_counter()
+        across_cross_sums = compute_cross_sums(GAME_BOARD)
+        down_cross_sums = compute_cross_sums(GAME_BOARD.transposed())
+
+        if stats is not None:
+            stats['anchors_seconds'] += anchors_time - start
+            stats['cross_checks_seconds'] += cross_checks_time - anchors_time
+            stats['cross_sums_seconds'] += time.perf_counter() - cross_checks_time
+
+    # The move being generated: the letters of the word so far (a letter played
+    # with a blank is lowercase), and the cell indices of the tiles played from
+    # the rack. The generators push onto them as they go, and pop off as they
+    # backtrack, so the search doesn't allocate anything until it finds a word.
+    WORD = []
+    PLAYED = []
+
+    def take_from_rack(tile_index, rack_mask):
         '''
+        Takes a letter (or a blank) off the rack.
 
-        # Extract the last letter index.
-        i, j = last_index
-
-        # Keep up with the number of double and triple word cells played.
-        dw = 0
-        tw = 0
-
-        # Compute the down word point value.
-        down_word_score = 0
-        for letter in word:
-            down_word_score += LETTER_VALUES[letter]
-
-        # Compute cross word point values.
-        cross_words_scores = []
-        for letter in word:
-            cross_words_scores.append(0)
-
-        for k in range(len(word)):
-            if [i - k, j] in rack_letter_indices:
-                if j != 0 and GAME_BOARD[i - k][j - 1] != ' ':
-                    l = j - 1
-                    while l > -1 and GAME_BOARD[i - k][l] != ' ':
-                        cross_words_scores[k] += LETTER_VALUES[GAME_BOARD[i - k][l]]
-                        l -= 1
-                if j != 14 and GAME_BOARD[i - k][j + 1] != ' ':
-                    l = j + 1
-                    while l < 15 and GAME_BOARD[i - k][l] != ' ':
-                        cross_words_scores[k] += LETTER_VALUES[GAME_BOARD[i - k][l]]
-                        l += 1
-                
-                if (
-                    j != 0 and GAME_BOARD[i - k][j - 1] != ' ' or
-                    j != 14 and GAME_BOARD[i - k][j + 1] != ' '
-                ):
-                    cross_words_scores[k] += LETTER_VALUES[word[len(word) - k - 1]]
-
-                # Compute bonus scores.
-                # Double Letter.
-                if GAME_BOARD_BONUSES[i - k][j] == 'DL':
-                    down_word_score += LETTER_VALUES[word[len(word) - k - 1]]
-
-                    if (
-                        j != 0 and GAME_BOARD[i - k][j - 1] != ' ' or
-                        j != 14 and GAME_BOARD[i - k][j + 1] != ' '
-                    ):
-                        cross_words_scores[k] += LETTER_VALUES[word[len(word) - k - 1]]
-                # Triple Letter.
-                elif GAME_BOARD_BONUSES[i - k][j] == 'TL':
-                    down_word_score += LETTER_VALUES[word[len(word) - k - 1]] * 2
-
-                    if (
-                        j != 0 and GAME_BOARD[i - k][j - 1] != ' ' or
-                        j != 14 and GAME_BOARD[i - k][j + 1] != ' '
-                    ):
-                        cross_words_scores[k] += LETTER_VALUES[word[len(word) - k - 1]] * 2
-                # Double Word.
-                elif GAME_BOARD_BONUSES[i - k][j] == 'DW':
-                    dw += 1
-
-                    cross_words_scores[k] *= 2
-                # Triple Word.
-                elif GAME_BOARD_BONUSES[i - k][j] == 'TW':
-                    tw += 1
-
-                    cross_words_scores[k] *= 3
-
-        # Factor in double and triple words for the down word.
-        for k in range(dw):
-            down_word_score *= 2
-
-        for k in range(tw):
-            down_word_score *= 3
-        
-        # If the full rack is played, add 35 to the down word score.
-        if len(rack_letter_indices) == 7:
-            down_word_score += 35
-
-        # Add cross word values to the down word value, and return it.
-        for score in cross_words_scores:
-            down_word_score += score
-
-        return down_word_score
-
-    def extend_down(index, rack, current_word, rack_played_incides):
+        Parameter {int} tile_index the rack index of the letter (or blank).
+        Parameter {int} rack_mask the mask of letters on the rack.
+        Returns {int} the mask of letters left on the rack.
         '''
-        Given an anchor position, recursively compute possible down word plays by
-        extending down on the board. For each word, compute its point value, and update
-        the best_down_word score accordingly.
-
-        Parameter {Array<int>} index the i, j index of the current position on the board.
-        Parameter {Array<str>} rack the user's letter rack.
-        Parameter {str} current_word the current permutation of the word.
-        Parameter {Array<Array<int>>} rack_played_incides a list of the indices of letters played
-        from the rack while extending down. 
+
+        RACK[tile_index] -= 1
+
+        if RACK[tile_index]:
+            return rack_mask
+
+        return rack_mask & ~(1 << tile_index)
+
+    def return_to_rack(tile_index):
         '''
+        Puts a letter taken with take_from_rack back on the rack.
 
-        # Extract the gameboard coordinates.
-        i, j = index
+        Parameter {int} tile_index the rack index of the letter (or blank).
+        '''
 
-        # Base Case - no common letters or out of the gameboard bounds.
-        if i > 14 or (GAME_BOARD[i][j] == ' ' and not intersection(rack, down_cross_checks[j][i])):
-            return
+        RACK[tile_index] += 1
 
-        # For the current coordinate, find common letters between the rack and cross checks.
-        common_letters = intersection(rack, down_cross_checks[j][i])
+    # Branch and bound: when the collector only keeps the best moves, words
+    # that can't score enough to be kept are cut as soon as their upper bound
+    # (see compute_score_bounds) falls below the collector's cutoff. Moves
+    # streamed to on_move aren't cut, since every move is streamed.
+    TILE_COUNT = sum(RACK)
+    prune = collector.limit is not None and collector.on_move is None
 
-        # Case 1: empty cell.
-        if GAME_BOARD[i][j] == ' ':
-            for letter in common_letters:
-                # Score the current word, if it's in the dictionary.
-                if (current_word + letter).lower() in DICTIONARY:
-                    if (i + 1 < 15 and GAME_BOARD[i + 1][j] == ' ') or i == 14:
-                        word = current_word + letter
-                        score = score_word_down(word, [i, j], rack_played_incides + [[i, j]])
-
-                        # Update the best across word, if the score of the current word is better.
-                        if score > best_down_word['score']:
-                            best_down_word['last_letter_index'] = [i, j]
-                            best_down_word['word'] = word
-                            best_down_word['score'] = score
-                
-                # Keep extending down to form words.
-                extend_down(
-                    [i + 1, j],
-                    filter_rack(rack, letter),
-                    current_word + letter,
-                    rack_played_incides + [[i, j]]
-                )
+    # The number of search nodes left until the token is checked.
+    COUNTDOWN = [TOKEN_CHECK_INTERVAL]
 
-        # Case 2: occupied cell.
-        else:
-            # Score the current word, if it's in the dictionary.
-            if (current_word + GAME_BOARD[i][j]).lower() in DICTIONARY:
-                if (i + 1 < 15 and GAME_BOARD[i + 1][j] == ' ') or i == 14:
-                    word = current_word + GAME_BOARD[i][j]
-                    score = score_word_down(word, [i, j], rack_played_incides)
-
-                    # Update the best across word, if the score of the current word is better.
-                    if score > best_down_word['score']:
-                        best_down_word['last_letter_index'] = [i, j]
-                        best_down_word['word'] = word
-                        best_down_word['score'] = score
-
-            # Keep extending down to form words.
-            extend_down(
-                [i + 1, j],
-                rack,
-                current_word + GAME_BOARD[i][j],
-                rack_played_incides
-            )
+    def check_token():
+        '''
+        Counts a search node, and checks the cancellation token (if any) once
+        every TOKEN_CHECK_INTERVAL nodes.
 
-    def extend_down_with_top_part(index, rack, top_part):
+        Raises {SearchCancelled} if the token says to stop.
         '''
-        Given a position above an anchor, recursively compute possible down word
-        plays by extending up before extending down on the board. For each word, compute 
-        its point value, and update the best_down_word score accordingly.
 
-        Parameter {Array<int>} index the i, j index of the current position on the board.
-        Parameter {Array<str>} rack the user's letter rack.
-        Parameter {str} top_part the current top_part of the word.
+        COUNTDOWN[0] -= 1
+
+        if not COUNTDOWN[0]:
+            COUNTDOWN[0] = TOKEN_CHECK_INTERVAL
+
+            if token.should_stop():
+                raise SearchCancelled()
+
+    def view_searches(game_board, cross_checks, cross_sums, view_lines):
+        '''
+        Prepare the searches of the anchors of a view of the game board, which
+        generate the moves played in the view's direction (across on the game
+        board, down on its transposed view), and offer each one to the collector.
+
+        Parameter {Board} game_board the game board view.
+        Parameter {Array<int>} cross_checks the cross checks of the view.
+        Parameter {Array<int>} cross_sums the cross sums of the view.
+        Parameter {Array<int>} view_lines the lines of the view (rows across,
+        columns down) to generate moves in, or None for all of them.
+        Returns {Array<tuple>} for each anchor, the upper bound on the score of
+        its moves (zero without pruning), its index, its search function, and
+        the direction of its moves.
         '''
 
-        # Extract the gameboard coordinates.
-        i, j = index
+        cells = game_board.cells
+        step = game_board.step
+        direction = game_board.direction()
+        bounds = compute_score_bounds(game_board, cross_sums, RACK) if prune else None
 
-        # Base Case - no common letters or out of the gameboard bounds.
-        if i < 0 or not intersection(rack, down_cross_checks[j][i]):
-            return
+        # The coordinate of a cell that's its line in the view.
+        line_coordinate = 0 if direction == 'across' else 1
 
-        # For the current coordinate, find common letters between the rack and cross checks.
-        common_letters = intersection(rack, down_cross_checks[j][i])
+        def offer(last_index, score):
+            '''
+            Offer the word being generated to the collector.
 
-        # Case 1: the cell above the current index is empty, or i = 0.
-        if i == 0 or GAME_BOARD[i - 1][j] == ' ':
-            for letter in common_letters:
-                word = letter + top_part
-                rack_played_incides = []
+            Parameter {int} last_index the index of the last letter of the word.
+            Parameter {int} score the score of the word, without the full rack bonus.
+            '''
 
-                for k in range(len(word)):
-                    rack_played_incides += [[i + k, j]]
+            # If the full rack is played, add 35 to the word score.
+            if len(PLAYED) == 7:
+                score += 35
 
-                # Extend down to form words.
-                extend_down(
-                    [i + len(word), j],
-                    filter_rack(rack, letter),
-                    word,
-                    rack_played_incides
-                )
+            collector.add(
+                score,
+                direction,
+                cell_coordinates(last_index),
+                ''.join(WORD),
+                [cell_coordinates(index) for index in PLAYED]
+            )
 
-                # Keep extending up.
-                extend_down_with_top_part(
-                    [i - 1, j],
-                    filter_rack(rack, letter),
-                    word
-                )
-        # Case 2: the cell above of the current index is occupied.
-        else:
-            pass
-
-    # Compute best down word.
-    for i in range(15):
-        for j in range(15):
-            if anchors[i][j]:
-                # Case 1: cell above the anchor is empty.
-                if i != 0 and GAME_BOARD[i - 1][j] == ' ':
-                    extend_down(
-                        [i, j],
-                        RACK,
-                        '',
-                        []
-                    )
+        def score_bound(index, points, word_multiplier, cross_points):
+            '''
+            Parameter {int} index the index of the cell the word continues from.
+            Parameter {int} points the points of the word's letters so far.
+            Parameter {int} word_multiplier the word multiplier of the word so far.
+            Parameter {int} cross_points the points of the cross words so far.
+            Returns {int} an upper bound on the score of any word continuing from the cell.
+            '''
+
+            letters_bound, word_multiplier_bound, cross_bound = bounds[index][TILE_COUNT - len(PLAYED)]
+
+            return (
+                (points + letters_bound) * word_multiplier * word_multiplier_bound +
+                cross_points +
+                cross_bound
+            )
 
-                    extend_down_with_top_part(
-                        [i - 1, j],
-                        RACK,
-                        ''
-                    )
-                # Case 2: cell above the anchor is occupied.
-                else:
-                    # Grab the word above the anchor, if there is one.
-                    word = ''
-                    k = i - 1
-                    while k != -1 and GAME_BOARD[k][j] != ' ':
-                        word = GAME_BOARD[k][j] + word
-                        k -= 1
-
-                    # Compute possible words extending down from the anchor.
-                    extend_down(
-                        [i, j],
-                        RACK,
-                        word,
-                        []
+        def extend(index, rack_mask, node, points, word_multiplier, cross_points):
+            '''
+            Given an anchor position, recursively compute possible word plays by
+            extending the word being generated on the board. For each word, compute
+            its point value, and offer it to the collector. The score of the word is
+            built up as its letters are placed, from the game board bonuses and the
+            cross sums of the view.
+
+            Parameter {int} index the index of the current cell.
+            Parameter {int} rack_mask the mask of letters left on the user's rack.
+            Parameter {int} node the lexicon node reached by the word being generated.
+            Parameter {int} points the points of the word's letters so far.
+            Parameter {int} word_multiplier the word multiplier of the word so far.
+            Parameter {int} cross_points the points of the cross words formed so far.
+            '''
+
+            if stats is not None:
+                stats['nodes'] += 1
+
+            cell = cells[index]
+
+            # Case 1: empty cell.
+            if cell == EMPTY:
+                if token is not None:
+                    check_token()
+
+                # Stop if no word from here can score enough to be kept.
+                if bounds is not None and score_bound(index, points, word_multiplier, cross_points) < collector.cutoff:
+                    return
+
+                # The letters that pass the cross check and continue a word.
+                allowed_letters = cross_checks[index] & LEXICON.edge_mask(node)
+                tiles = playable_tiles(allowed_letters, rack_mask)
+
+                if stats is not None:
+                    stats['probes'] += bin(tiles).count('1')
+
+                # Whether a word ending in this cell is complete.
+                ends_word = cells[index + step] <= BORDER
+
+                letter_multiplier = LETTER_MULTIPLIERS[index]
+                cell_word_multiplier = WORD_MULTIPLIERS[index]
+                cross_sum = cross_sums[index]
+
+                PLAYED.append(index)
+                WORD.append('')
+
+                while tiles:
+                    bit = tiles & -tiles
+                    tiles ^= bit
+                    letter_index, tile_index, letter, value = TILE_CHOICES[bit.bit_length() - 1]
+                    next_node = LEXICON.child_index(node, letter_index)
+                    WORD[-1] = letter
+
+                    # Letters played from the rack score their bonuses, and the
+                    # cross word they form (if any).
+                    letter_points = value * letter_multiplier
+                    next_cross_points = cross_points
+                    if cross_sum != -1:
+                        next_cross_points += (cross_sum + letter_points) * cell_word_multiplier
+
+                    # Score the current word, if it's in the dictionary.
+                    if ends_word and LEXICON.is_word(next_node):
+                        offer(
+                            index,
+                            (points + letter_points) * word_multiplier * cell_word_multiplier +
+                            next_cross_points
+                        )
+
+                    # Keep extending to form words.
+                    extend(
+                        index + step,
+                        take_from_rack(tile_index, rack_mask),
+                        next_node,
+                        points + letter_points,
+                        word_multiplier * cell_word_multiplier,
+                        next_cross_points
                     )
+                    return_to_rack(tile_index)
 
-    if best_across_word['score'] > best_down_word['score']:
-        return best_across_word
-    else:
-        return best_down_word
+                WORD.pop()
+                PLAYED.pop()
+
+            # Case 2: occupied cell (the border of the gameboard ends the word).
+            elif cell != BORDER:
+                if stats is not None:
+                    stats['probes'] += 1
+
+                # Stop if no word continues with the letter on the board (a
+                # blank is the letter it's played as).
+                next_node = LEXICON.child(node, chr(cell).upper())
+                if not next_node:
+                    return
+
+                WORD.append(chr(cell))
+
+                # Letters already on the board score their plain value.
+                points += TILE_VALUES[chr(cell)]
+
+                # Score the current word, if it's in the dictionary.
+                if LEXICON.is_word(next_node) and cells[index + step] <= BORDER:
+                    offer(index, points * word_multiplier + cross_points)
+
+                # Keep extending to form words.
+                extend(index + step, rack_mask, next_node, points, word_multiplier, cross_points)
+
+                WORD.pop()
+
+        def extend_with_left_part(index, rack_mask, node, length, points, word_multiplier, cross_points):
+            '''
+            Given the cell where a left part of an anchor starts (the part of a word
+            before its anchor), recursively place the left part's letters by walking
+            the lexicon from its root (so left parts that no word starts with are cut
+            immediately), then extend from the anchor. For each word, compute its
+            point value, and offer it to the collector.
+
+            Parameter {int} index the index of the current cell.
+            Parameter {int} rack_mask the mask of letters left on the user's rack.
+            Parameter {int} node the lexicon node reached by the left part placed so far.
+            Parameter {int} length the number of letters of the left part left to place.
+            Parameter {int} points the points of the left part's letters so far.
+            Parameter {int} word_multiplier the word multiplier of the left part so far.
+            Parameter {int} cross_points the points of the cross words formed so far.
+            '''
+
+            # Base Case - the left part is placed, so extend from the anchor.
+            if not length:
+                extend(index, rack_mask, node, points, word_multiplier, cross_points)
+                return
+
+            if stats is not None:
+                stats['nodes'] += 1
+
+            if token is not None:
+                check_token()
+
+            # Stop if no word from here can score enough to be kept.
+            if bounds is not None and score_bound(index, points, word_multiplier, cross_points) < collector.cutoff:
+                return
+
+            # The letters that pass the cross check and continue a word.
+            allowed_letters = cross_checks[index] & LEXICON.edge_mask(node)
+            tiles = playable_tiles(allowed_letters, rack_mask)
+
+            if stats is not None:
+                stats['probes'] += bin(tiles).count('1')
+
+            letter_multiplier = LETTER_MULTIPLIERS[index]
+            cell_word_multiplier = WORD_MULTIPLIERS[index]
+            cross_sum = cross_sums[index]
+
+            PLAYED.append(index)
+            WORD.append('')
+
+            while tiles:
+                bit = tiles & -tiles
+                tiles ^= bit
+                letter_index, tile_index, letter, value = TILE_CHOICES[bit.bit_length() - 1]
+                WORD[-1] = letter
+
+                letter_points = value * letter_multiplier
+                next_cross_points = cross_points
+                if cross_sum != -1:
+                    next_cross_points += (cross_sum + letter_points) * cell_word_multiplier
+
+                extend_with_left_part(
+                    index + step,
+                    take_from_rack(tile_index, rack_mask),
+                    LEXICON.child_index(node, letter_index),
+                    length - 1,
+                    points + letter_points,
+                    word_multiplier * cell_word_multiplier,
+                    next_cross_points
+                )
+                return_to_rack(tile_index)
+
+            WORD.pop()
+            PLAYED.pop()
+
+        def left_part_limit(index):
+            '''
+            The left part can use the empty cells before the anchor up to the
+            previous anchor (Appel and Jacobson's scheme), and one tile less than
+            the rack, since the anchor needs a tile too. A word covering more
+            than one anchor is only generated from the first of them, so every
+            move is generated exactly once. The cells before an anchor can't touch
+            a letter, since a cell next to a letter is itself an anchor.
+
+            Parameter {int} index the index of an anchor with an empty cell before it.
+            Returns {int} the longest left part of the anchor.
+            '''
+
+            max_length = 0
+            k = index - step
+            while cells[k] == EMPTY and not anchors[k]:
+                max_length += 1
+                k -= step
+
+            return min(max_length, TILE_COUNT - 1)
+
+        def prefix_points(index):
+            '''
+            Parameter {int} index the index of an anchor.
+            Returns {int} the points of the letters on the board right before the anchor.
+            '''
+
+            points = 0
+            k = index - step
+            while cells[k] > BORDER:
+                points += TILE_VALUES[game_board[k]]
+                k -= step
+
+            return points
+
+        def search_anchor(index):
+            '''
+            Generate the moves through an anchor, and offer each one to the collector.
+
+            Parameter {int} index the index of the anchor.
+            '''
+
+            # Case 1: cell before the anchor is empty.
+            if cells[index - step] == EMPTY:
+                extend(index, RACK_MASK, LEXICON.root, 0, 1, 0)
+
+                for length in range(1, left_part_limit(index) + 1):
+                    extend_with_left_part(index - length * step, RACK_MASK, LEXICON.root, length, 0, 1, 0)
+            # Case 2: cell before the anchor is occupied (or the border).
+            else:
+                # Grab the word before the anchor, if there is one.
+                k = index - step
+                while cells[k] > BORDER:
+                    WORD.append(game_board[k])
+                    k -= step
+                WORD.reverse()
+
+                # Compute possible words extending from the anchor.
+                node = LEXICON.find(''.join(WORD).upper())
+                if stats is not None:
+                    stats['probes'] += len(WORD)
+                if node:
+                    extend(index, RACK_MASK, node, prefix_points(index), 1, 0)
+
+                del WORD[:]
+
+        searches = []
+
+        for index in CELL_INDICES:
+            if anchors[index] and (
+                view_lines is None or
+                cell_coordinates(index)[line_coordinate] in view_lines
+            ):
+                bound = 0
+
+                # The bound of the anchor covers its longest left part, or the word before it.
+                if bounds is not None:
+                    if cells[index - step] == EMPTY:
+                        bound = score_bound(index - left_part_limit(index) * step, 0, 1, 0)
+                    else:
+                        bound = score_bound(index, prefix_points(index), 1, 0)
+
+                searches.append((bound, index, search_anchor, direction))
+
+        return searches
+
+    # Compute the across words, and the down words.
+    searches = view_searches(
+        GAME_BOARD,
+        across_cross_checks,
+        across_cross_sums,
+        None if lines is None else lines['across']
+    )
+    searches += view_searches(
+        GAME_BOARD.transposed(),
+        down_cross_checks,
+        down_cross_sums,
+        None if lines is None else lines['down']
+    )
+
+    # Search the anchors with the highest bounds first, so the best moves are
+    # found early, and stop at the first anchor that can't beat them.
+    searches.sort(key=lambda search: -search[0])
+
+    try:
+        for bound, index, search_anchor, direction in searches:
+            # Without pruning, every bound is zero, so every anchor is searched.
+            if prune and bound < collector.cutoff:
+                break
+
+            if token is not None and token.should_stop():
+                raise SearchCancelled()
+
+            if stats is None:
+                search_anchor(index)
+                continue
+
+            stats['anchors'] += 1
+            start = time.perf_counter()
+
+            try:
+                search_anchor(index)
+            finally:
+                stats[direction + '_seconds'] += time.perf_counter() - start
+    # Stopped early, so the collector has the best moves found so far.
+    except SearchCancelled:
+        token.partial = True
+
+    if stats is not None:
+        stats['scored'] += collector.offered - offered
+        stats['duplicates'] += collector.duplicates - duplicates
+        stats['candidates'] += collector.kept - kept
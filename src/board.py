@@ -0,0 +1,99 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+'''
+
+# The size of the game board, and the size of a row of the game board with its border.
+SIZE = 15
+STRIDE = SIZE + 2
+
+# The values of an empty cell and of a border cell. A cell with a letter holds
+# the letter's character code, which is greater than both, so `cell > BORDER`
+# means the cell has a letter.
+EMPTY = ord(' ')
+BORDER = ord('#')
+
+def cell_index(row, column):
+    '''
+    Parameter {int} row the row of a cell, from 0 to 14.
+    Parameter {int} column the column of a cell, from 0 to 14.
+    Returns {int} the index of the cell in the board's cells.
+    '''
+
+    return (row + 1) * STRIDE + column + 1
+
+def cell_coordinates(index):
+    '''
+    Parameter {int} index the index of a cell in the board's cells.
+    Returns {tuple<int>} the row and column of the cell.
+    '''
+
+    row, column = divmod(index, STRIDE)
+
+    return row - 1, column - 1
+
+# The index of every cell of the game board (not the border), row by row.
+CELL_INDICES = [cell_index(row, column) for row in range(SIZE) for column in range(SIZE)]
+
+class Board:
+    '''
+    A WWF game board, kept as a flat bytearray of cells: the 15x15 board in
+    the middle of a border of sentinel cells, so walking off the board lands on
+    a BORDER cell instead of needing bounds checks. Cells are indexed with
+    cell_index.
+
+    A board is also a view of the game in one direction of play: step is the
+    index offset to the next cell of a word, and cross_step the offset to the
+    next cell of a cross word. The transposed view shares the same cells, so the
+    code that generates across words generates down words on the transposed view.
+    '''
+
+    __slots__ = ('cells', 'step', 'cross_step')
+
+    def __init__(self, cells=None, step=1, cross_step=STRIDE):
+        '''
+        Parameter {bytearray} cells the cells to view, defaults to an empty board.
+        Parameter {int} step the index offset to the next cell of a word.
+        Parameter {int} cross_step the index offset to the next cell of a cross word.
+        '''
+
+        if cells is None:
+            cells = bytearray([BORDER]) * (STRIDE * STRIDE)
+
+            for row in range(SIZE):
+                cells[cell_index(row, 0):cell_index(row, SIZE)] = bytes([EMPTY]) * SIZE
+
+        self.cells = cells
+        self.step = step
+        self.cross_step = cross_step
+
+    def transposed(self):
+        '''
+        Returns {Board} a view of the same cells, with words played in the other direction.
+        '''
+
+        return Board(self.cells, self.cross_step, self.step)
+
+    def direction(self):
+        '''
+        Returns {str} the direction words are played in on this view, 'across' or 'down'.
+        '''
+
+        return 'across' if self.step == 1 else 'down'
+
+    def __getitem__(self, index):
+        '''
+        Parameter {int} index the index of a cell.
+        Returns {str} the letter in the cell, or ' ' if it's empty.
+        '''
+
+        return chr(self.cells[index])
+
+    def __setitem__(self, index, letter):
+        '''
+        Parameter {int} index the index of a cell.
+        Parameter {str} letter the letter to put in the cell, or ' ' to empty it.
+        '''
+
+        self.cells[index] = ord(letter)
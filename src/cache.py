@@ -0,0 +1,78 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+'''
+
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    '''
+    A thread safe cache with a size limit, which evicts the least recently used
+    entry when it's full. It counts its hits, misses and evictions.
+    '''
+
+    def __init__(self, max_size):
+        '''
+        Parameter {int} max_size the most entries to keep (zero disables the cache).
+        '''
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        '''
+        Looks up an entry, marking it as the most recently used.
+
+        Parameter {any} key the key of the entry.
+        Parameter {any} default the value to return if there's no entry.
+        Returns {any} the cached value, or the default.
+        '''
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        '''
+        Adds (or replaces) an entry, evicting the least recently used entries
+        if the cache is full.
+
+        Parameter {any} key the key of the entry.
+        Parameter {any} value the value to cache.
+        '''
+
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        '''
+        Returns {dict} the size, size limit, hits, misses and evictions of the cache.
+        '''
+
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,92 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+'''
+
+import threading
+import time
+
+class SearchCancelled(Exception):
+    '''
+    Raised inside a search when its cancellation token says to stop, to unwind
+    the move generators.
+    '''
+
+class CancellationToken:
+    '''
+    Lets a search be stopped before it's done: when the token is cancelled
+    (from another thread), or when its time budget runs out. The move
+    generators check the token regularly, and a stopped search returns the
+    best moves found so far, with the token marked as partial.
+    '''
+
+    def __init__(self, budget=None):
+        '''
+        Parameter {float} budget the number of seconds the search may take, or
+        None for no deadline.
+        '''
+
+        self.budget = budget
+        self.deadline = None
+        self.cancelled = False
+        self.partial = False
+
+        # Called when the token is cancelled, e.g. to stop a search running in
+        # another process (see on_cancel).
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+        if budget is not None:
+            self.set_budget(budget)
+
+    def set_budget(self, budget):
+        '''
+        Sets the deadline of the search, from now.
+
+        Parameter {float} budget the number of seconds the search may take.
+        '''
+
+        self.budget = budget
+        self.deadline = time.monotonic() + budget
+
+    def cancel(self):
+        '''
+        Asks the search to stop, and calls the token's cancel callbacks.
+        '''
+
+        with self._lock:
+            self.cancelled = True
+
+            for callback in self._callbacks:
+                callback()
+
+    def on_cancel(self, callback):
+        '''
+        Registers a function to call when the token is cancelled (right away, if
+        it already is). It's called with the token's lock held, so once
+        remove_on_cancel returns, it isn't called any more.
+
+        Parameter {function} callback the function to call, without arguments.
+        '''
+
+        with self._lock:
+            self._callbacks.append(callback)
+
+            if self.cancelled:
+                callback()
+
+    def remove_on_cancel(self, callback):
+        '''
+        Parameter {function} callback a function registered with on_cancel.
+        '''
+
+        with self._lock:
+            self._callbacks.remove(callback)
+
+    def should_stop(self):
+        '''
+        Returns {bool} whether the search was cancelled, or is past its deadline.
+        '''
+
+        return self.cancelled or (self.deadline is not None and time.monotonic() >= self.deadline)
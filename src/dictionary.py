@@ -5,13 +5,464 @@ Date: 03/28/2020
 '''
 
 import os
+import threading
+from itertools import compress
+
+from lexicon import (EDGE_MASK, EDGE_SLOTS, TERMINAL, build_lexicon, open_lexicon, save_lexicon)
+
+WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'words.txt')
+LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'words.dawg')
+
+ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Translates the binary digits of a bitset to bytes that are 0 or 1.
+BIT_BYTES = bytes.maketrans(b'01', b'\x00\x01')
+
+# The anagram index, built on first use (see get_anagram_index).
+ANAGRAM_INDEX = None
+ANAGRAM_INDEX_LOCK = threading.Lock()
+
+# The pattern index, built on first use (see get_pattern_index).
+PATTERN_INDEX = None
+PATTERN_INDEX_LOCK = threading.Lock()
+
+class AnagramIndex:
+    '''
+    An index of the words by signature: the letters of a word, sorted, which
+    every anagram of the word shares. The signatures are kept in a DAWG, so
+    the words a rack can make are found by walking it in alphabetical order,
+    taking letters from the rack as the walk goes: each sub-multiset of the
+    rack is visited at most once, and only while some signature starts with
+    it. A blank can stand for any letter the walk continues with.
+    '''
+
+    def __init__(self, words, letter_values):
+        '''
+        Parameter {iterable<str>} words the words to index.
+        Parameter {dict} letter_values the points of each (uppercase) letter.
+        '''
+
+        self.letter_values = [letter_values[chr(65 + index)] for index in range(26)]
+        self.words = {}
+
+        for word in words:
+            word = word.upper()
+            self.words.setdefault(''.join(sorted(word)), []).append(word)
+
+        for anagrams in self.words.values():
+            anagrams.sort()
+
+        self.signatures = build_lexicon(self.words)
+
+    def find(self, rack, board_letters='', min_length=2):
+        '''
+        Find the words that can be made from a rack, optionally with letters
+        on the board as well. Each word uses at least one tile from the rack
+        (a letter both the rack and the board have can be the rack's). Blanks
+        are only used for letters the rack and board don't have.
+
+        Parameter {str} rack the letters on the rack ('?' is a blank).
+        Parameter {str} board_letters the letters on the board the words can use.
+        Parameter {int} min_length the length of the shortest words to find.
+        Returns {Array<dict>} the words, grouped by length and base score (the
+        points of their letters, without bonuses), longest and best first. A
+        letter played with a blank is lowercase, and scores no points.
+        '''
+
+        # The walk reads the signature DAWG's arrays directly, since it's the
+        # whole cost of a query.
+        flags = self.signatures.flags
+        edges = self.signatures.edges
+        words = self.words
+        letter_values = self.letter_values
+        rack_counts = [0] * 26
+        board_counts = [0] * 26
+        blanks = [0]
+
+        for letter in rack.upper():
+            if letter == '?':
+                blanks[0] += 1
+            elif 'A' <= letter <= 'Z':
+                rack_counts[ord(letter) - 65] += 1
+
+        for letter in board_letters.upper():
+            if 'A' <= letter <= 'Z':
+                board_counts[ord(letter) - 65] += 1
+
+        # The letters the rack or board have copies of, the letters the rack
+        # has, the signature being walked, and the letters of it played with blanks.
+        available = [sum(1 << index for index in range(26) if rack_counts[index] or board_counts[index])]
+        on_rack = [bool(count) for count in rack_counts]
+        signature = []
+        blanked = []
+        groups = {}
+
+        def walk(node, first, score, uses_rack):
+            '''
+            Parameter {int} node the signature DAWG node reached.
+            Parameter {int} first the alphabet index of the first letter the
+            signature can continue with (signatures are sorted).
+            Parameter {int} score the points of the signature's letters.
+            Parameter {bool} uses_rack whether the signature can use a tile from
+            the rack: a blank, or a letter the rack has (even if a copy of it
+            on the board is counted first).
+            '''
+
+            node_flags = flags[node]
+
+            if node_flags & TERMINAL and uses_rack and len(signature) >= min_length:
+                group = groups.setdefault((len(signature), score), [])
+
+                if blanked:
+                    group.extend(mark_blanks(word, blanked) for word in words[''.join(signature)])
+                else:
+                    group.extend(words[''.join(signature)])
+
+            # The letters the signature continues with, that can be played.
+            letters = (node_flags & EDGE_MASK) >> first << first
+
+            if not blanks[0]:
+                letters &= available[0]
+
+            while letters:
+                bit = letters & -letters
+                letters ^= bit
+                index = bit.bit_length() - 1
+                letter = ALPHABET[index]
+                child = edges[node * EDGE_SLOTS + index]
+                signature.append(letter)
+
+                # Case 1: a blank, for a letter the rack and board don't have.
+                if not available[0] & bit:
+                    blanks[0] -= 1
+                    blanked.append(letter)
+                    walk(child, index, score, True)
+                    blanked.pop()
+                    blanks[0] += 1
+                # Case 2: a letter on the board, or a tile on the rack.
+                else:
+                    counts = board_counts if board_counts[index] else rack_counts
+                    counts[index] -= 1
+
+                    if not board_counts[index] and not rack_counts[index]:
+                        available[0] ^= bit
+
+                    walk(child, index, score + letter_values[index], uses_rack or on_rack[index])
+
+                    available[0] |= bit
+                    counts[index] += 1
+
+                signature.pop()
+
+        walk(self.signatures.root, 0, 0, False)
+
+        return [
+            {'length': length, 'score': score, 'words': sorted(groups[(length, score)])}
+            for length, score in sorted(groups, reverse=True)
+        ]
+
+def mark_blanks(word, blanked):
+    '''
+    Parameter {str} word a word (uppercase).
+    Parameter {Array<str>} blanked the letters of the word played with blanks.
+    Returns {str} the word, with the last occurrence of each blanked letter lowercase.
+    '''
+
+    for letter in blanked:
+        index = word.rindex(letter)
+        word = word[:index] + letter.lower() + word[index + 1:]
+
+    return word
+
+class PatternIndex:
+    '''
+    An index of the words by the letter at each position, for finding the
+    words that fit a pattern of known and unknown letters, like "?A??S".
+    The words of each length are numbered, and for each position and letter
+    a bitset (a Python int, bit i for word i) marks the words with that
+    letter there, so a query is an AND of the bitsets of the pattern's
+    letters. A rack is checked with the same bitsets: each unknown position
+    is ORed over the rack's letters, and the copies of each letter are
+    counted a bitset per count.
+    '''
+
+    def __init__(self, words):
+        '''
+        Parameter {iterable<str>} words the words to index.
+        '''
+
+        # The words of each length, sorted, and the bitsets of each of their
+        # positions, by letter.
+        self.words = {}
+        self.bitsets = {}
+
+        for word in words:
+            self.words.setdefault(len(word), []).append(word.upper())
+
+        # A translation table per letter, that turns a column of letters into
+        # the binary digits of its bitset.
+        digits = [
+            bytes(ord('1') if byte == ord(letter) else ord('0') for byte in range(256))
+            for letter in ALPHABET
+        ]
+
+        for length, length_words in self.words.items():
+            length_words.sort()
+            self.bitsets[length] = []
+
+            for position in range(length):
+                # The letters of the words at the position, last word first,
+                # so the first word is the lowest bit.
+                column = ''.join(word[position] for word in reversed(length_words)).encode()
+
+                self.bitsets[length].append([
+                    int(column.translate(table), 2) for table in digits
+                ])
+
+    def match(self, pattern, rack=None):
+        '''
+        Find the words that fit a pattern, optionally filling its unknown
+        positions with tiles from a rack.
+
+        Parameter {str} pattern the letters of the words, with '?' (or '.')
+        for the unknown positions.
+        Parameter {str} rack the letters on the rack ('?' is a blank), or None
+        for any letters.
+        Returns {Array<str>} the words that fit, sorted. With a rack, a letter
+        played with a blank is lowercase.
+        Raises {ValueError} if the pattern has characters other than letters
+        and unknowns.
+        '''
+
+        pattern = pattern.upper().replace('.', '?')
+
+        if not all(letter == '?' or 'A' <= letter <= 'Z' for letter in pattern):
+            raise ValueError('The pattern must be letters, and ? (or .) for unknown letters.')
+
+        if len(pattern) not in self.words:
+            return []
+
+        words = self.words[len(pattern)]
+        bitsets = self.bitsets[len(pattern)]
+        unknowns = [position for position, letter in enumerate(pattern) if letter == '?']
+        matches = (1 << len(words)) - 1
+
+        for position, letter in enumerate(pattern):
+            if letter != '?':
+                matches &= bitsets[position][ord(letter) - 65]
+
+        rack_counts = None
+        blanks = 0
+
+        if rack is not None:
+            rack = rack.upper()
+            blanks = rack.count('?')
+            rack_counts = [0] * 26
+
+            for letter in rack:
+                if 'A' <= letter <= 'Z':
+                    rack_counts[ord(letter) - 65] += 1
+
+            if len(unknowns) > sum(rack_counts) + blanks:
+                return []
+
+            rack_letters = [index for index in range(26) if rack_counts[index]]
+
+            # The words with each number of unknown positions (up to the
+            # number of blanks) that aren't a letter of the rack, and need a blank.
+            missing = [matches] + [0] * blanks
+
+            for position in unknowns:
+                supplied = 0
+
+                for index in rack_letters:
+                    supplied |= bitsets[position][index]
+
+                for count in range(blanks, 0, -1):
+                    missing[count] = missing[count] & supplied | missing[count - 1] & ~supplied
+
+                missing[0] &= supplied
+
+            matches = 0
+
+            for words_missing in missing:
+                matches |= words_missing
+
+            # Without blanks, drop the words with more copies of a letter at
+            # unknown positions than the rack has, so every match fits the rack.
+            if not blanks:
+                for index in rack_letters:
+                    if rack_counts[index] >= len(unknowns):
+                        continue
+
+                    # The words with at least each number of copies of the
+                    # letter, up to one more than the rack has.
+                    copies = [matches] + [0] * (rack_counts[index] + 1)
+
+                    for position in unknowns:
+                        letter_bitset = bitsets[position][index]
+
+                        for count in range(len(copies) - 1, 0, -1):
+                            copies[count] |= copies[count - 1] & letter_bitset
+
+                    matches &= ~copies[-1]
+
+        # The matches are the words at the 1s of the bitset's binary digits,
+        # lowest bit first. A few are found by searching for them, and many
+        # by compressing the words with the digits (as bytes that are 0 or 1).
+        digits = bin(matches)[:1:-1]
+
+        if digits.count('1') * 16 > len(digits):
+            found = list(compress(words, digits.encode().translate(BIT_BYTES)))
+        else:
+            found = []
+            index = digits.find('1')
+
+            while index >= 0:
+                found.append(words[index])
+                index = digits.find('1', index + 1)
+
+        if not blanks:
+            return found
+
+        return [
+            word for word in (fill_from_rack(word, unknowns, rack_counts, blanks) for word in found)
+            if word is not None
+        ]
+
+def fill_from_rack(word, unknowns, rack_counts, blanks):
+    '''
+    Parameter {str} word a word that fits a pattern (uppercase).
+    Parameter {Array<int>} unknowns the unknown positions of the pattern.
+    Parameter {Array<int>} rack_counts the number of each letter on the rack.
+    Parameter {int} blanks the number of blanks on the rack.
+    Returns {str} the word, with the letters played with blanks lowercase, or
+    None if the rack can't fill its unknown positions.
+    '''
+
+    counts = list(rack_counts)
+    letters = list(word)
+
+    for position in unknowns:
+        index = ord(word[position]) - 65
+
+        # Case 1: a tile on the rack.
+        if counts[index]:
+            counts[index] -= 1
+        # Case 2: a blank.
+        elif blanks:
+            blanks -= 1
+            letters[position] = letters[position].lower()
+        # Case 3: the rack is out of the letter.
+        else:
+            return None
+
+    return ''.join(letters)
+
+def get_anagram_index():
+    '''
+    Returns {AnagramIndex} the anagram index of the dictionary, built on first
+    use (it takes a couple of seconds).
+    '''
+
+    global ANAGRAM_INDEX
+
+    # Imported here, since best_game_move imports this module to load the lexicon.
+    from best_game_move import LETTER_VALUES
+
+    with ANAGRAM_INDEX_LOCK:
+        if ANAGRAM_INDEX is None:
+            ANAGRAM_INDEX = AnagramIndex(load_words(), LETTER_VALUES)
+
+        return ANAGRAM_INDEX
+
+def find_words(rack, board_letters='', min_length=2):
+    '''
+    Find the words that can be made from a rack, optionally with letters on
+    the board as well (see AnagramIndex.find).
+
+    Parameter {str} rack the letters on the rack ('?' is a blank).
+    Parameter {str} board_letters the letters on the board the words can use.
+    Parameter {int} min_length the length of the shortest words to find.
+    Returns {Array<dict>} the words, grouped by length and base score.
+    '''
+
+    return get_anagram_index().find(rack, board_letters, min_length)
+
+def get_pattern_index():
+    '''
+    Returns {PatternIndex} the pattern index of the dictionary, built on first use.
+    '''
+
+    global PATTERN_INDEX
+
+    with PATTERN_INDEX_LOCK:
+        if PATTERN_INDEX is None:
+            PATTERN_INDEX = PatternIndex(load_words())
+
+        return PATTERN_INDEX
+
+def match_words(pattern, rack=None):
+    '''
+    Find the words that fit a pattern, like "?A??S", optionally filling its
+    unknown positions with tiles from a rack (see PatternIndex.match).
+
+    Parameter {str} pattern the letters of the words, with '?' for unknown letters.
+    Parameter {str} rack the letters on the rack ('?' is a blank), or None for any letters.
+    Returns {Array<str>} the words that fit, sorted.
+    Raises {ValueError} if the pattern has characters other than letters and '?'.
+    '''
+
+    return get_pattern_index().match(pattern, rack)
 
 def load_words():
     '''
     Returns a set of all words in the dictionary.
     '''
 
-    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'words.txt')) as word_file:
+    with open(WORDS_PATH) as word_file:
         valid_words = set(word_file.read().split())
 
     return valid_words
+
+def compile_lexicon():
+    '''
+    Builds the lexicon from the word list, and saves it as the compiled
+    lexicon file.
+
+    Returns {Lexicon} the newly built lexicon.
+    '''
+
+    lexicon = build_lexicon(load_words())
+    save_lexicon(lexicon, LEXICON_PATH)
+
+    return lexicon
+
+def load_lexicon():
+    '''
+    Returns the lexicon (a prefix-searchable DAWG) of all words in the dictionary.
+    The compiled lexicon file is memory mapped when it's up to date with the word
+    list. Otherwise, the lexicon is rebuilt from the word list, and the compiled
+    file is rewritten (if the directory is writable).
+    '''
+
+    # Memory map the compiled lexicon, if it isn't older than the word list.
+    try:
+        if os.path.getmtime(LEXICON_PATH) >= os.path.getmtime(WORDS_PATH):
+            return open_lexicon(LEXICON_PATH)
+    except (OSError, ValueError):
+        pass
+
+    # Fall back to building the lexicon from the word list.
+    lexicon = build_lexicon(load_words())
+
+    try:
+        save_lexicon(lexicon, LEXICON_PATH)
+    except OSError:
+        pass
+
+    return lexicon
+
+# Compile the lexicon (run as part of the build).
+if __name__ == '__main__':
+    compile_lexicon()
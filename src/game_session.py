@@ -0,0 +1,178 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+'''
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from best_game_move import (
+    compute_anchors,
+    compute_cross_check,
+    compute_cross_checks,
+    compute_cross_sum,
+    compute_cross_sums,
+    game_letter_index,
+    is_anchor,
+    populate_game_board,
+    request_game_board
+)
+from board import BORDER, CELL_INDICES, STRIDE, cell_index
+
+# The most game sessions kept in memory, the least recently used are dropped.
+MAX_SESSIONS = 1024
+
+# All game sessions, by game id, in least to most recently used order.
+SESSIONS = OrderedDict()
+SESSIONS_LOCK = threading.Lock()
+
+# Whether requests may send only a delta. Sessions are kept per process, so
+# when requests are spread over several server processes (see server.py), a
+# process's session can miss the deltas sent to the others, and every request
+# must send the full game board instead.
+DELTAS_ENABLED = True
+
+class UnknownGameError(Exception):
+    '''
+    Raised when only a delta is sent for a game without a session (it was never
+    started, or it's been dropped), so the full game board must be sent instead.
+    '''
+
+class GameSession:
+    '''
+    The state of a game that's kept between requests: the game board, and its
+    anchors, cross checks and cross sums. Applying a move only recomputes the
+    anchors, cross checks and cross sums of the rows and columns that it touched.
+    '''
+
+    def __init__(self, letters=()):
+        '''
+        Parameter {Array<dict>} letters the game letters with letter and index
+        key-value pairs.
+        '''
+
+        self.lock = threading.Lock()
+        self.game_board = populate_game_board(letters)
+        self.anchors = compute_anchors(self.game_board)
+        self.across_cross_checks = compute_cross_checks(self.game_board)
+        self.down_cross_checks = compute_cross_checks(self.game_board.transposed())
+        self.across_cross_sums = compute_cross_sums(self.game_board)
+        self.down_cross_sums = compute_cross_sums(self.game_board.transposed())
+
+    def apply(self, letters):
+        '''
+        Sets (or clears) cells of the game board, and updates the anchors, cross
+        checks and cross sums affected by them.
+
+        Parameter {Array<dict>} letters the changed cells with letter and index
+        key-value pairs. An empty (or null) letter clears the cell.
+        Raises {ValueError} if a letter's index isn't a cell of the game board,
+        in which case the game board isn't changed.
+        '''
+
+        cells = []
+        indices = [game_letter_index(letter) for letter in letters]
+
+        for index, letter in zip(indices, letters):
+            value = letter['letter'] or ' '
+
+            if self.game_board[index] != value:
+                self.game_board[index] = value
+                cells.append(index)
+
+        # A cross check (and cross sum) only depends on the line across its
+        # view's direction: its column for across words, and its row for down words.
+        for game_board, cross_checks, cross_sums in (
+            (self.game_board, self.across_cross_checks, self.across_cross_sums),
+            (self.game_board.transposed(), self.down_cross_checks, self.down_cross_sums)
+        ):
+            cross_step = game_board.cross_step
+            lines = set()
+
+            for index in cells:
+                # Find the first cell of the line through the changed cell.
+                while game_board.cells[index - cross_step] != BORDER:
+                    index -= cross_step
+
+                lines.add(index)
+
+            for index in lines:
+                while game_board.cells[index] != BORDER:
+                    cross_checks[index] = compute_cross_check(game_board, index)
+                    cross_sums[index] = compute_cross_sum(game_board, index)
+                    index += cross_step
+
+        # An anchor only depends on its cell and the adjacent cells. The center
+        # cell is always recomputed, since it's the only anchor of an empty board.
+        for index in cells + [cell_index(7, 7)]:
+            for neighbor in (index, index - 1, index + 1, index - STRIDE, index + STRIDE):
+                self.anchors[neighbor] = is_anchor(self.game_board, neighbor)
+
+        if not any(self.anchors):
+            self.anchors[cell_index(7, 7)] = 1
+
+    def sync(self, game_board):
+        '''
+        Brings the game board up to date with the full game board, only
+        applying the cells that changed.
+
+        Parameter {Board} game_board the full game board.
+        '''
+
+        game_board = game_board.cells
+        changes = []
+
+        for index, board_index in enumerate(CELL_INDICES):
+            if game_board[board_index] != self.game_board.cells[board_index]:
+                changes.append({'letter': chr(game_board[board_index]), 'index': index})
+
+        self.apply(changes)
+
+@contextmanager
+def open_session(json_data):
+    '''
+    Finds (or starts) the game session for a request, and brings it up to date
+    with the request's gameLetters or board (the full game board) or delta (the
+    changed cells). The session is locked until the with block exits.
+
+    Parameter {dict} json_data request data with an optional gameId.
+    Yields {GameSession} the game session, or None if the request has no gameId.
+    Raises {UnknownGameError} if a delta is sent for a game without a session,
+    or without the full game board when deltas aren't enabled.
+    '''
+
+    game_id = json_data.get('gameId')
+
+    if game_id is None:
+        yield None
+        return
+
+    if not DELTAS_ENABLED and 'gameLetters' not in json_data and 'board' not in json_data:
+        raise UnknownGameError(game_id)
+
+    with SESSIONS_LOCK:
+        session = SESSIONS.get(game_id)
+
+        # Start a new session, dropping the least recently used if there are too many.
+        if session is None:
+            if 'gameLetters' not in json_data and 'board' not in json_data:
+                raise UnknownGameError(game_id)
+
+            session = GameSession()
+            SESSIONS[game_id] = session
+
+            while len(SESSIONS) > MAX_SESSIONS:
+                SESSIONS.popitem(last=False)
+        else:
+            SESSIONS.move_to_end(game_id)
+
+    with session.lock:
+        if 'gameLetters' in json_data or 'board' in json_data:
+            session.sync(request_game_board(json_data))
+
+        if 'delta' in json_data:
+            session.apply(json_data['delta'])
+
+        yield session
@@ -0,0 +1,312 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+Reference: Daciuk et al., Incremental Construction of Minimal Acyclic Finite-State Automata
+'''
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# Each node owns 26 edge slots, one per letter. Node 0 is the dead node, so an
+# edge value of 0 means "no edge".
+EDGE_SLOTS = 26
+
+# Node flag bits. The low 26 bits hold the node's edge mask (bit n set means
+# there is an edge for the nth letter of the alphabet).
+EDGE_MASK = (1 << 26) - 1
+TERMINAL = 1 << 26
+
+# Compiled lexicon file layout: a header, then the flags array, then the edges
+# array, all as native unsigned 32 bit integers.
+FILE_MAGIC = b'WWFDAWG1'
+FILE_HEADER = struct.Struct('=8s4sII')
+
+class _BuildNode:
+    '''
+    A mutable trie node, only used while the lexicon is being built.
+    '''
+
+    __slots__ = ('children', 'terminal')
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = False
+
+    def signature(self):
+        '''
+        Returns {tuple} a key that is equal for nodes with equivalent right languages.
+        '''
+
+        return (
+            self.terminal,
+            tuple((letter, id(child)) for letter, child in sorted(self.children.items()))
+        )
+
+class Lexicon:
+    '''
+    A minimized DAWG (directed acyclic word graph) over the uppercase alphabet.
+    Nodes are integers, and every prefix of a word in the lexicon reaches a
+    non-zero node, so move generation can stop as soon as a prefix is dead.
+    '''
+
+    def __init__(self, edges, flags, root, buffer=None):
+        '''
+        Parameter {array<int>} edges the child of each node for each letter,
+        indexed by node * 26 + letter.
+        Parameter {array<int>} flags the edge mask and terminal bit of each node.
+        Parameter {int} root the node for the empty prefix.
+        Parameter {mmap} buffer the memory map backing edges and flags, if any.
+        '''
+
+        self.edges = edges
+        self.flags = flags
+        self.root = root
+        self._buffer = buffer
+
+    def child(self, node, letter):
+        '''
+        Follow the edge for a letter.
+
+        Parameter {int} node the current node.
+        Parameter {str} letter an uppercase letter.
+        Returns {int} the child node, or 0 if no word continues with the letter.
+        '''
+
+        index = ord(letter) - 65
+
+        if index < 0 or index > 25:
+            return 0
+
+        return self.edges[node * EDGE_SLOTS + index]
+
+    def child_index(self, node, index):
+        '''
+        Follow the edge for a letter, by its alphabet index.
+
+        Parameter {int} node the current node.
+        Parameter {int} index the alphabet index of the letter, from 0 to 25.
+        Returns {int} the child node, or 0 if no word continues with the letter.
+        '''
+
+        return self.edges[node * EDGE_SLOTS + index]
+
+    def is_word(self, node):
+        '''
+        Parameter {int} node the node to check.
+        Returns {bool} whether the path to the node spells a word.
+        '''
+
+        return bool(self.flags[node] & TERMINAL)
+
+    def edge_mask(self, node):
+        '''
+        Parameter {int} node the node to check.
+        Returns {int} a 26 bit mask of the letters that have an edge out of the node.
+        '''
+
+        return self.flags[node] & EDGE_MASK
+
+    def find(self, word, node=None):
+        '''
+        Walk a word (or word fragment) through the lexicon.
+
+        Parameter {str} word the letters to walk.
+        Parameter {int} node the node to start from, defaults to the root.
+        Returns {int} the node reached, or 0 if the letters aren't a prefix of any word.
+        '''
+
+        if node is None:
+            node = self.root
+
+        for letter in word:
+            node = self.child(node, letter)
+
+            if not node:
+                return 0
+
+        return node
+
+    def completions(self, prefix, suffix):
+        '''
+        Find the letters that complete a word with a gap, prefix + ? + suffix,
+        in one traversal: the prefix is walked once, and the suffix is only
+        walked from the prefix's children.
+
+        Parameter {str} prefix the letters before the gap.
+        Parameter {str} suffix the letters after the gap.
+        Returns {int} a 26 bit mask of the letters that make a word in the gap.
+        '''
+
+        node = self.find(prefix)
+
+        if not node:
+            return 0
+
+        mask = 0
+        letters = self.edge_mask(node)
+
+        while letters:
+            bit = letters & -letters
+            letters ^= bit
+            end = self.find(suffix, self.child_index(node, bit.bit_length() - 1))
+
+            if end and self.is_word(end):
+                mask |= bit
+
+        return mask
+
+    def __contains__(self, word):
+        node = self.find(word.upper())
+
+        return bool(node) and self.is_word(node)
+
+def build_lexicon(words):
+    '''
+    Builds the minimal DAWG for a collection of words.
+
+    Parameter {iterable<str>} words the words to add (any case).
+    Returns {Lexicon} the lexicon.
+    '''
+
+    register = {}
+    root = _BuildNode()
+    unchecked = []
+    previous_word = ''
+
+    def minimize(down_to):
+        '''
+        Replace the unchecked nodes below down_to with their registered
+        equivalents, or register them if they're new.
+
+        Parameter {int} down_to the length of the path to keep unchecked.
+        '''
+
+        while len(unchecked) > down_to:
+            parent, letter, child = unchecked.pop()
+            signature = child.signature()
+
+            if signature in register:
+                parent.children[letter] = register[signature]
+            else:
+                register[signature] = child
+
+    # Words must be added in sorted order.
+    for word in sorted(set(word.upper() for word in words)):
+        if not word.isalpha() or not word.isascii():
+            continue
+
+        # Find the length of the prefix shared with the previous word.
+        common_prefix = 0
+        while (
+            common_prefix < len(word) and
+            common_prefix < len(previous_word) and
+            word[common_prefix] == previous_word[common_prefix]
+        ):
+            common_prefix += 1
+
+        minimize(common_prefix)
+
+        # Add the suffix that isn't shared.
+        node = unchecked[-1][2] if unchecked else root
+        for letter in word[common_prefix:]:
+            child = _BuildNode()
+            node.children[letter] = child
+            unchecked.append((node, letter, child))
+            node = child
+
+        node.terminal = True
+        previous_word = word
+
+    minimize(0)
+
+    # Number the nodes (0 is reserved for the dead node).
+    numbers = {id(root): 1}
+    order = [root]
+    for node in order:
+        for letter, child in sorted(node.children.items()):
+            if id(child) not in numbers:
+                numbers[id(child)] = len(order) + 1
+                order.append(child)
+
+    edges = array('I', [0]) * (EDGE_SLOTS * (len(order) + 1))
+    flags = array('I', [0]) * (len(order) + 1)
+
+    for node in order:
+        number = numbers[id(node)]
+
+        if node.terminal:
+            flags[number] |= TERMINAL
+
+        for letter, child in node.children.items():
+            index = ord(letter) - 65
+            edges[number * EDGE_SLOTS + index] = numbers[id(child)]
+            flags[number] |= 1 << index
+
+    return Lexicon(edges, flags, 1)
+
+def save_lexicon(lexicon, path):
+    '''
+    Writes a lexicon to a compiled lexicon file. The file is written next to
+    its destination and moved into place, so readers never see a partial file.
+
+    Parameter {Lexicon} lexicon the lexicon to save.
+    Parameter {str} path the path of the compiled lexicon file.
+    '''
+
+    temporary_path = '%s.%d.tmp' % (path, os.getpid())
+
+    try:
+        with open(temporary_path, 'wb') as lexicon_file:
+            lexicon_file.write(FILE_HEADER.pack(
+                FILE_MAGIC,
+                sys.byteorder[0].encode() * 4,
+                len(lexicon.flags),
+                lexicon.root
+            ))
+            lexicon_file.write(array('I', lexicon.flags).tobytes())
+            lexicon_file.write(array('I', lexicon.edges).tobytes())
+
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+def open_lexicon(path):
+    '''
+    Memory maps a compiled lexicon file. The mapping is read only, so every
+    process that opens the same file shares one copy through the page cache.
+
+    Parameter {str} path the path of the compiled lexicon file.
+    Returns {Lexicon} the lexicon.
+    Raises {ValueError} if the file isn't a compiled lexicon for this platform.
+    '''
+
+    with open(path, 'rb') as lexicon_file:
+        buffer = mmap.mmap(lexicon_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if array('I').itemsize != 4 or len(buffer) < FILE_HEADER.size:
+        buffer.close()
+        raise ValueError('%s is not a compiled lexicon' % path)
+
+    magic, byteorder, node_count, root = FILE_HEADER.unpack_from(buffer)
+    flags_start = FILE_HEADER.size
+    edges_start = flags_start + 4 * node_count
+    edges_end = edges_start + 4 * node_count * EDGE_SLOTS
+
+    if (
+        magic != FILE_MAGIC or
+        byteorder != sys.byteorder[0].encode() * 4 or
+        len(buffer) != edges_end
+    ):
+        buffer.close()
+        raise ValueError('%s is not a compiled lexicon' % path)
+
+    view = memoryview(buffer)
+    flags = view[flags_start:edges_start].cast('I')
+    edges = view[edges_start:edges_end].cast('I')
+
+    return Lexicon(edges, flags, root, buffer)
@@ -0,0 +1,149 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+'''
+
+import threading
+
+# Histogram buckets for durations, in seconds.
+SECONDS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Histogram buckets for counts of search work (anchors, nodes, probes, ...).
+COUNT_BUCKETS = [10 ** power * step for power in range(7) for step in (1, 2, 5)]
+
+class Histogram:
+    '''
+    A thread safe histogram of observed values, with cumulative buckets, which
+    renders in the Prometheus text exposition format. Observations can have a
+    label, e.g. the endpoint or search phase they were observed in, and each
+    label value gets its own buckets.
+    '''
+
+    def __init__(self, name, description, buckets, label=None):
+        '''
+        Parameter {str} name the metric name.
+        Parameter {str} description the help text of the metric.
+        Parameter {Array<float>} buckets the upper bounds of the buckets, ascending.
+        Parameter {str} label the name of the observations' label, if any.
+        '''
+
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.label = label
+
+        # The bucket counts, sum and count of the observations, by label value.
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        '''
+        Parameter {float} value the observed value.
+        Parameter {str} label_value the value of the observation's label, if any.
+        '''
+
+        with self._lock:
+            if label_value not in self._series:
+                self._series[label_value] = [[0] * len(self.buckets), 0, 0]
+
+            series = self._series[label_value]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        '''
+        Returns {Array<str>} the lines of the histogram in the Prometheus text format.
+        '''
+
+        lines = [
+            '# HELP %s %s' % (self.name, self.description),
+            '# TYPE %s histogram' % self.name
+        ]
+
+        with self._lock:
+            for label_value in sorted(self._series, key=str):
+                bucket_counts, total, count = self._series[label_value]
+                labels = '' if self.label is None else '%s="%s",' % (self.label, label_value)
+
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append('%s_bucket{%sle="%s"} %d' % (self.name, labels, format_value(bound), bucket_count))
+
+                lines.append('%s_bucket{%sle="+Inf"} %d' % (self.name, labels, count))
+
+                labels = '{%s}' % labels[:-1] if labels else ''
+                lines.append('%s_sum%s %s' % (self.name, labels, format_value(total)))
+                lines.append('%s_count%s %d' % (self.name, labels, count))
+
+        return lines
+
+class CacheMetrics:
+    '''
+    Exposes the counters of caches (see cache.LRUCache.stats) in the Prometheus
+    text exposition format: their hits, misses and evictions as counters, and
+    their size as a gauge, with a label for each cache.
+    '''
+
+    # The name suffix, type and help text of each counter of a cache's stats.
+    METRICS = {
+        'hits': ('hits_total', 'counter', 'Cache lookups that found an entry.'),
+        'misses': ('misses_total', 'counter', 'Cache lookups that found no entry.'),
+        'evictions': ('evictions_total', 'counter', 'Cache entries evicted to make room for new ones.'),
+        'size': ('size', 'gauge', 'Entries in the cache.')
+    }
+
+    def __init__(self, name, caches):
+        '''
+        Parameter {str} name the prefix of the metric names.
+        Parameter {dict} caches the caches, by the value of their cache label.
+        '''
+
+        self.name = name
+        self.caches = caches
+
+    def render(self):
+        '''
+        Returns {Array<str>} the lines of the cache metrics in the Prometheus text format.
+        '''
+
+        stats = {label_value: cache.stats() for label_value, cache in self.caches.items()}
+        lines = []
+
+        for counter, (suffix, kind, description) in self.METRICS.items():
+            name = '%s_%s' % (self.name, suffix)
+            lines.append('# HELP %s %s' % (name, description))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+            for label_value in sorted(stats):
+                lines.append('%s{cache="%s"} %d' % (name, label_value, stats[label_value][counter]))
+
+        return lines
+
+def format_value(value):
+    '''
+    Parameter {float} value a bucket bound, or a sum.
+    Returns {str} the value, without a trailing .0 for whole numbers.
+    '''
+
+    if value == int(value):
+        return str(int(value))
+
+    return repr(float(value))
+
+def render(collectors):
+    '''
+    Parameter {Array<Histogram|CacheMetrics>} collectors the metrics to expose.
+    Returns {str} the metrics in the Prometheus text exposition format.
+    '''
+
+    lines = []
+
+    for collector in collectors:
+        lines += collector.render()
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,200 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+'''
+
+import heapq
+
+class MoveCollector:
+    '''
+    Collects the moves found by the move generators.
+
+    With a limit, only the best `limit` distinct moves are kept, in a bounded
+    min-heap whose smallest entry is the move to beat, so memory stays O(limit)
+    however many moves are generated. Without a limit, every distinct move is
+    kept (full move enumeration). Either way, an on_move callback can stream
+    each distinct move as soon as it's found.
+
+    Moves are ranked by score. Ties are broken by preferring down moves, then
+    moves ending nearer the top left of the board, then the word, so the
+    ranking doesn't depend on the order moves are generated in.
+    '''
+
+    def __init__(self, limit=None, on_move=None, count_duplicates=False):
+        '''
+        Parameter {int} limit the number of best moves to keep, or None to keep all.
+        Parameter {function} on_move called with each distinct move as it's found.
+        Parameter {bool} count_duplicates whether to remember every move offered,
+        so every repeat is counted, even of moves that don't make the cut (it
+        takes memory for every move, so it's for instrumented searches).
+        '''
+
+        self.limit = limit
+        self.on_move = on_move
+
+        # The ranks of the kept moves (a min-heap, when limited), and the kept
+        # moves by rank. A rank identifies a move, so it's also used to skip
+        # moves that are generated more than once.
+        self._heap = []
+        self._moves = {}
+
+        # The ranks of every move streamed to on_move.
+        self._streamed = set()
+
+        # The ranks of every move offered, when counting duplicates.
+        self._offered = set() if count_duplicates else None
+
+        # The number of moves offered, how many of them were offered again
+        # (without count_duplicates, only moves that are kept, or streamed,
+        # are recognized as repeats), and how many made the cut when they
+        # were offered.
+        self.offered = 0
+        self.duplicates = 0
+        self.kept = 0
+
+        # The score a move needs to be kept: the score of the worst kept move once
+        # the heap is full (a searching generator can skip moves scoring less).
+        self.cutoff = -1
+
+    def add(self, score, direction, last_index, word, played_indices):
+        '''
+        Offers a move to the collector.
+
+        Parameter {int} score the score of the move.
+        Parameter {str} direction 'across' or 'down'.
+        Parameter {Array<int>} last_index the i, j index of the last letter of the word.
+        Parameter {str} word the word played.
+        Parameter {Array<Array<int>>} played_indices the indices of the letters
+        played from the rack.
+        '''
+
+        self.offered += 1
+
+        # Count the repeats of every move, before any is rejected.
+        if self._offered is not None:
+            rank = (score, direction == 'down', -last_index[0], -last_index[1], word)
+
+            if rank in self._offered:
+                self.duplicates += 1
+                return
+
+            self._offered.add(rank)
+
+        # Quick reject: the heap is full, and the move can't beat the worst kept
+        # move (every move is streamed, so none is rejected with on_move).
+        if score < self.cutoff and self.on_move is None:
+            return
+
+        rank = (score, direction == 'down', -last_index[0], -last_index[1], word)
+
+        if rank in self._moves or rank in self._streamed:
+            self.duplicates += 1
+            return
+
+        if self.on_move is not None:
+            self._streamed.add(rank)
+            self.on_move(self._move(rank, played_indices))
+
+        if self._accepts(rank):
+            self._keep(rank, self._move(rank, played_indices))
+
+    def merge(self, ranked_moves):
+        '''
+        Offers the moves kept by another collector to the collector, e.g. to
+        merge the moves found by the partitions of a parallel search.
+
+        Parameter {Array<tuple>} ranked_moves the rank and move data of each
+        move (see ranked_moves).
+        '''
+
+        for rank, move in ranked_moves:
+            if rank not in self._moves and self._accepts(rank):
+                self._keep(rank, move)
+
+    def _accepts(self, rank):
+        '''
+        Parameter {tuple} rank the rank of a move that isn't kept.
+        Returns {bool} whether the move makes the cut.
+        '''
+
+        return self.limit is None or len(self._heap) < self.limit or rank > self._heap[0]
+
+    def _keep(self, rank, move):
+        '''
+        Keeps a move that makes the cut, dropping the worst kept move if the
+        heap is full.
+
+        Parameter {tuple} rank the rank of the move.
+        Parameter {dict} move the move data.
+        '''
+
+        self._moves[rank] = move
+        self.kept += 1
+
+        # Keep every move.
+        if self.limit is None:
+            return
+
+        # The heap isn't full yet.
+        if len(self._heap) < self.limit:
+            heapq.heappush(self._heap, rank)
+        # The move is better than the worst kept move, so it replaces it.
+        else:
+            del self._moves[heapq.heapreplace(self._heap, rank)]
+
+        if len(self._heap) >= self.limit:
+            self.cutoff = self._heap[0][0]
+
+    def moves(self):
+        '''
+        Returns {Array<dict>} the kept moves, best first.
+        '''
+
+        return [self._moves[rank] for rank in sorted(self._moves, reverse=True)]
+
+    def ranked_moves(self):
+        '''
+        Returns {Array<tuple>} the rank and move data of each kept move, best first.
+        '''
+
+        return [(rank, self._moves[rank]) for rank in sorted(self._moves, reverse=True)]
+
+    def _move(self, rank, played_indices):
+        '''
+        Builds the move data for a ranked move.
+
+        Parameter {tuple} rank the rank of the move.
+        Parameter {Array<Array<int>>} played_indices the indices of the letters
+        played from the rack.
+        Returns {dict} the move data.
+        '''
+
+        score, down, i, j, word = rank
+        i = -i
+        j = -j
+
+        # The tiles played from the rack, with their letters, and which of them
+        # are blanks (a blank is written as the lowercase letter it's played as).
+        tiles = []
+        blanks = []
+        for k, l in played_indices:
+            offset = i - k if down else j - l
+            letter = word[len(word) - offset - 1]
+
+            if letter.islower():
+                blanks.append([k, l])
+
+            tiles.append([k, l, letter.upper()])
+
+        tiles.sort()
+        blanks.sort()
+
+        return {
+            'last_letter_index': [i, j],
+            'word': word.upper(),
+            'score': score,
+            'direction': 'down' if down else 'across',
+            'tiles': tiles,
+            'blanks': blanks
+        }
@@ -0,0 +1,199 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+'''
+
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# The directory profiles are written to. Profiling is off unless it's set with
+# the WWF_PROFILE_DIR environment variable.
+PROFILE_DIR = os.environ.get('WWF_PROFILE_DIR')
+
+# The fraction of requests to profile, set with WWF_PROFILE_SAMPLE_RATE.
+PROFILE_SAMPLE_RATE = float(os.environ.get('WWF_PROFILE_SAMPLE_RATE', '0'))
+
+# Requests that take at least this many seconds are kept, set with
+# WWF_PROFILE_THRESHOLD (zero for none). Since a request can't be known to be
+# slow until it's done, every request is profiled when it's set.
+PROFILE_THRESHOLD = float(os.environ.get('WWF_PROFILE_THRESHOLD', '0'))
+
+# The format of the profiles, set with WWF_PROFILE_FORMAT: 'pstats' (cProfile
+# output, for pstats or snakeviz), or 'collapsed' (sampled stacks, one per
+# line with its count, for flamegraph.pl or speedscope).
+PROFILE_FORMAT = os.environ.get('WWF_PROFILE_FORMAT', 'pstats')
+
+# The most profiles kept in the directory, the oldest are deleted.
+MAX_PROFILES = int(os.environ.get('WWF_PROFILE_MAX_FILES', '50'))
+
+# The request header that asks for a request to be profiled.
+PROFILE_HEADER = 'X-Profile'
+
+# The seconds between stack samples of the collapsed stack profiler.
+SAMPLE_INTERVAL = 0.001
+
+# Serializes writing profiles, and deleting the oldest.
+PROFILE_DIR_LOCK = threading.Lock()
+
+class StackSampler:
+    '''
+    A sampling profiler: a background thread that samples the stack of a
+    thread at regular intervals, and counts each distinct stack, so the
+    profiled thread runs at (nearly) full speed.
+    '''
+
+    def __init__(self, thread_id):
+        '''
+        Parameter {int} thread_id the identifier of the thread to sample.
+        '''
+
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def enable(self):
+        '''
+        Starts sampling.
+        '''
+
+        self._thread.start()
+
+    def disable(self):
+        '''
+        Stops sampling, and waits for the sampling thread to finish.
+        '''
+
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        '''
+        Samples the thread's stack until the sampler is disabled.
+        '''
+
+        while not self._stopped.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+
+            while frame is not None:
+                code = frame.f_code
+                stack.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump_stats(self, path):
+        '''
+        Parameter {str} path the path to write the collapsed stacks to.
+        '''
+
+        with open(path, 'w') as profile_file:
+            for stack, count in self.stacks.most_common():
+                profile_file.write('%s %d\n' % (stack, count))
+
+@contextmanager
+def profile_request(json_data, name, forced=False):
+    '''
+    Profiles the code run in its block, if profiling is enabled (see
+    PROFILE_DIR) and the request is sampled, asked for, or turns out to be
+    slower than PROFILE_THRESHOLD. The profile is written to the profile
+    directory, next to the request data, and the oldest profiles are deleted
+    once there are more than MAX_PROFILES.
+
+    Parameter {dict} json_data the request data.
+    Parameter {str} name the name of the endpoint, for the profile's file name.
+    Parameter {bool} forced whether the request asked to be profiled.
+    '''
+
+    if PROFILE_DIR is None:
+        yield
+        return
+
+    sampled = forced or random.random() < PROFILE_SAMPLE_RATE
+
+    if not sampled and not PROFILE_THRESHOLD:
+        yield
+        return
+
+    if PROFILE_FORMAT == 'collapsed':
+        profiler = StackSampler(threading.get_ident())
+    else:
+        profiler = cProfile.Profile()
+
+    # Only one cProfile profiler can run at a time on newer Pythons, so a
+    # request that overlaps a profiled one isn't profiled.
+    try:
+        profiler.enable()
+    except ValueError:
+        yield
+        return
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+
+        if sampled or elapsed >= PROFILE_THRESHOLD:
+            write_profile(profiler, json_data, name, elapsed)
+
+def write_profile(profiler, json_data, name, elapsed):
+    '''
+    Writes a profile and its request data to the profile directory, and
+    deletes the oldest profiles past MAX_PROFILES.
+
+    Parameter {cProfile.Profile|StackSampler} profiler the disabled profiler.
+    Parameter {dict} json_data the request data.
+    Parameter {str} name the name of the endpoint.
+    Parameter {float} elapsed the seconds the request took.
+    '''
+
+    # Profiles are named by the time they're written (to the millisecond), so
+    # they sort oldest first.
+    now = time.time()
+    extension = 'collapsed' if isinstance(profiler, StackSampler) else 'prof'
+    base_name = '%s-%03d-%s-%dms-%s' % (
+        time.strftime('%Y%m%d-%H%M%S', time.localtime(now)),
+        now % 1 * 1000,
+        name,
+        elapsed * 1000,
+        os.urandom(3).hex()
+    )
+
+    with PROFILE_DIR_LOCK:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, '%s.%s' % (base_name, extension)))
+
+        # A serving pool worker's position has the game board's cells as bytes.
+        with open(os.path.join(PROFILE_DIR, base_name + '.json'), 'w') as request_file:
+            json.dump(json_data, request_file, default=lambda value: value.decode('latin-1'))
+
+        # Each profile is a pair of files with the same base name.
+        base_names = sorted(set(
+            os.path.splitext(file_name)[0]
+            for file_name in os.listdir(PROFILE_DIR)
+            if file_name.endswith(('.prof', '.collapsed', '.json'))
+        ))
+
+        for old_name in base_names[:max(0, len(base_names) - MAX_PROFILES)]:
+            for old_extension in ('prof', 'collapsed', 'json'):
+                path = os.path.join(PROFILE_DIR, '%s.%s' % (old_name, old_extension))
+
+                # Another process (e.g. a serving pool worker) may have
+                # deleted it already.
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
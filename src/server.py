@@ -0,0 +1,129 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+
+The production launcher: loads the app (the lexicon, and the scoring tables)
+once in a master process, freezes it, then forks server processes that share
+it copy-on-write and accept connections on the same listening socket. The
+master restarts server processes that die, and stops them on SIGINT or SIGTERM.
+
+Usage: python dist/server.py [--host HOST] [--port PORT] [--workers N]
+'''
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+import app
+import best_game_move
+import game_session
+
+def preload():
+    '''
+    Loads everything the server processes share before they're forked: the
+    app and its modules (with the scoring tables) are imported above, and the
+    lexicon, which is memory mapped rather than made of Python objects, is
+    read into the page cache once for all of them. Then the garbage collector
+    is run, and the objects left are frozen, so the collector doesn't write to
+    (and copy) their pages in the server processes.
+    '''
+
+    # Read one value per page (of 1024 4-byte values).
+    lexicon = best_game_move.LEXICON
+    sum(lexicon.flags[::1024])
+    sum(lexicon.edges[::1024])
+
+    gc.collect()
+    gc.freeze()
+
+def serve(listener):
+    '''
+    Runs in a server process: serves the app on the shared listening socket,
+    with a thread per request, until the process is stopped.
+
+    Parameter {socket} listener the listening socket.
+    '''
+
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app.app, threaded=True, fd=listener.fileno())
+    server.serve_forever()
+
+def fork_server(listener):
+    '''
+    Parameter {socket} listener the listening socket.
+    Returns {int} the process id of a new server process.
+    '''
+
+    pid = os.fork()
+
+    if pid:
+        return pid
+
+    # The server process stops on SIGINT and SIGTERM, not the master's handlers.
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    try:
+        serve(listener)
+    finally:
+        os._exit(0)
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the app on several forked processes.')
+    parser.add_argument('--host', default='127.0.0.1', help='the address to listen on')
+    parser.add_argument('--port', type=int, default=5000, help='the port to listen on')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='the number of server processes')
+    args = parser.parse_args()
+
+    # Sessions are kept per server process, so with several, every request
+    # must send the full game board.
+    game_session.DELTAS_ENABLED = args.workers == 1
+
+    listener = socket.create_server((args.host, args.port), backlog=128)
+    listener.set_inheritable(True)
+
+    preload()
+
+    servers = set(fork_server(listener) for _ in range(args.workers))
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+        for pid in servers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print('Serving on http://%s:%d with %d processes' % (args.host, args.port, args.workers))
+    sys.stdout.flush()
+
+    # Wait on the server processes, and restart any that die.
+    while servers:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        servers.discard(pid)
+
+        if not stopping:
+            print('Server process %d exited, restarting it' % pid)
+            time.sleep(0.1)
+            servers.add(fork_server(listener))
+
+if __name__ == '__main__':
+    main()
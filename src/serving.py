@@ -0,0 +1,338 @@
+'''
+Authors: Elijah Sawyers
+Emails: elijahsawyers@gmail.com
+Date: 10/17/2026
+'''
+
+import collections
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import best_game_move
+import profiling
+from cancellation import CancellationToken
+
+# The number of worker processes requests' searches run on, set with the
+# WWF_SERVING_WORKERS environment variable. Zero runs each search in its
+# request thread instead.
+SERVING_WORKERS = int(os.environ.get('WWF_SERVING_WORKERS', '0'))
+
+# The most searches that can wait for a free worker, set with the
+# WWF_SERVING_QUEUE_DEPTH environment variable. Requests past it are turned
+# away right away.
+SERVING_QUEUE_DEPTH = int(os.environ.get('WWF_SERVING_QUEUE_DEPTH', '16'))
+
+# The seconds a turned away client is told to wait before retrying, set with
+# the WWF_RETRY_AFTER environment variable.
+RETRY_AFTER = int(os.environ.get('WWF_RETRY_AFTER', '1'))
+
+# In a worker process, the cancel flags of the pool's searches, shared with the
+# pool (see WorkerToken).
+CANCEL_FLAGS = None
+
+class QueueFullError(Exception):
+    '''
+    Raised when a search is submitted to a serving pool whose workers are busy
+    and whose queue is full.
+    '''
+
+class ServingPool:
+    '''
+    A bounded pool of worker processes that run the searches of requests, so a
+    heavy search doesn't hold the request layer, and the server has admission
+    control: at most one search per worker runs, at most queue_depth more
+    wait, and the rest are rejected with QueueFullError instead of piling up.
+    The workers load the lexicon when they start.
+
+    Each search waiting or running has a cancel flag, in an array shared with
+    the workers, so a search that's cancelled after it started stops right
+    away instead of holding its worker until its deadline.
+    '''
+
+    def __init__(self, workers, queue_depth):
+        '''
+        Parameter {int} workers the number of worker processes.
+        Parameter {int} queue_depth the most searches that can wait for a worker.
+        '''
+
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+
+        # A cancel flag per place in the queue, and the flags not in use.
+        self._cancel_flags = multiprocessing.RawArray('b', workers + queue_depth)
+        self._free_flags = list(range(workers + queue_depth))
+        self._free_flags_lock = threading.Lock()
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=load_worker,
+            initargs=(self._cancel_flags,)
+        )
+
+    def search(self, json_data, k, token=None, instrument=False, name='search', profile=False):
+        '''
+        Runs a search on a worker, and waits for it. A search still waiting for
+        a worker when its token is cancelled is dropped, and a running search
+        stops right away.
+
+        Parameter {dict} json_data the position, with the game board and the
+        user's letter rack (a game session can't be shared with the workers).
+        Parameter {int} k the number of moves to search for, or None for every move.
+        Parameter {CancellationToken} token the token to cancel the search with,
+        if any. The search's budget starts when a worker picks it up, and the
+        token is marked as partial if the search was stopped before it was done.
+        Parameter {bool} instrument whether to count the work of the search.
+        Parameter {str} name the name of the endpoint, for the search's profile.
+        Parameter {bool} profile whether the request asked to be profiled (the
+        worker profiles the search, see profiling.profile_request).
+        Returns {dict} the search's moves, counters (if instrumented), and the
+        seconds it waited for a worker (wait_seconds) and ran (exec_seconds).
+        Raises {QueueFullError} if the pool's queue is full.
+        '''
+
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError()
+
+        # There's a free cancel flag for each place in the queue.
+        with self._free_flags_lock:
+            flag = self._free_flags.pop()
+
+        self._cancel_flags[flag] = 0
+
+        def cancel_search():
+            self._cancel_flags[flag] = 1
+
+        def free_flag():
+            # The token mustn't set the flag once another search has it.
+            if token is not None:
+                token.remove_on_cancel(cancel_search)
+
+            with self._free_flags_lock:
+                self._free_flags.append(flag)
+
+        if token is not None:
+            token.on_cancel(cancel_search)
+
+        submitted = time.monotonic()
+        future = self._submit(
+            run_search,
+            json_data,
+            k,
+            None if token is None else token.budget,
+            instrument,
+            flag,
+            name,
+            profile,
+            on_done=free_flag
+        )
+
+        while token is not None and not future.done():
+            wait([future], timeout=best_game_move.TOKEN_POLL_INTERVAL)
+
+            # Drop the search if it hasn't started; a running search stops at
+            # its cancel flag.
+            if token.cancelled and future.cancel():
+                token.partial = True
+
+                return {
+                    'moves': [],
+                    'stats': None,
+                    'wait_seconds': time.monotonic() - submitted,
+                    'exec_seconds': 0
+                }
+
+        result = future.result()
+
+        if result['partial'] and token is not None:
+            token.partial = True
+
+        return {
+            'moves': result['moves'],
+            'stats': result.get('stats'),
+            'wait_seconds': result['started'] - submitted,
+            'exec_seconds': result['finished'] - result['started']
+        }
+
+    def search_batch(self, positions, k, ordered=True, budget=None):
+        '''
+        Searches many positions on the workers, under the same admission control
+        as single searches: the batch is turned away if the queue is full when
+        it starts, and then takes a place in the queue for each position, with
+        at most one position per worker queued at a time. Positions still
+        queued when the results are closed (e.g. the client went away) are dropped.
+
+        Parameter {Array<dict>} positions the positions, each with the game
+        board, the user's letter rack, and an optional id.
+        Parameter {int} k the number of moves of each position, or None for every move.
+        Parameter {bool} ordered whether to yield the results in the order of
+        the positions (otherwise, in the order they complete).
+        Parameter {float} budget the number of seconds the search of each
+        position may take, if limited.
+        Returns {generator} the result of each position (see best_game_move.compute_batch).
+        Raises {QueueFullError} if the pool's queue is full.
+        '''
+
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError()
+
+        # Start the generator, so the place in the queue is given back when
+        # it's closed, even before its first result.
+        results = self._batch_results(positions, k, ordered, budget)
+        next(results)
+
+        return results
+
+    def _batch_results(self, positions, k, ordered, budget):
+        '''
+        Yields the results of a batch admitted by search_batch, which holds a
+        place in the queue for its first position. It first yields None, when
+        it's started (see search_batch).
+        '''
+
+        pending = collections.deque()
+        reserved = True
+
+        try:
+            yield
+
+            for index, position in enumerate(positions):
+                # Take a place in the queue, waiting for the batch's own
+                # results first, or for other searches once it has none queued.
+                while not reserved:
+                    if self._slots.acquire(blocking=False):
+                        reserved = True
+                    elif pending:
+                        yield from best_game_move.next_batch_results(pending, ordered)
+                    else:
+                        reserved = self._slots.acquire()
+
+                # The place is the submitted search's (it gives it back).
+                reserved = False
+                pending.append(self._submit(
+                    best_game_move.search_position,
+                    position.get('id', index),
+                    position,
+                    k,
+                    budget
+                ))
+
+                if len(pending) >= self.workers:
+                    yield from best_game_move.next_batch_results(pending, ordered)
+
+            while pending:
+                yield from best_game_move.next_batch_results(pending, ordered)
+        finally:
+            if reserved:
+                self._slots.release()
+
+            # A cancelled search releases its place in the queue.
+            for future in pending:
+                future.cancel()
+
+    def _submit(self, function, *args, on_done=None):
+        '''
+        Submits a call to a worker, for a search that has taken a place in the
+        queue, and gives the place back when the call is done (or cancelled).
+
+        Parameter {function} function the function to call.
+        Parameter {list} args the arguments of the call.
+        Parameter {function} on_done a function to call when the call is done,
+        before its place is given back, if any.
+        Returns {Future} the future of the call.
+        '''
+
+        def release(future=None):
+            if on_done is not None:
+                on_done()
+
+            self._slots.release()
+
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            release()
+            raise
+
+        future.add_done_callback(release)
+
+        return future
+
+class WorkerToken(CancellationToken):
+    '''
+    The cancellation token of a search on a serving pool worker, which is also
+    cancelled when the pool sets the search's cancel flag.
+    '''
+
+    def __init__(self, flag):
+        '''
+        Parameter {int} flag the index of the search's cancel flag.
+        '''
+
+        super().__init__()
+        self.flag = flag
+
+    def should_stop(self):
+        '''
+        Returns {bool} whether the search was cancelled, or is past its deadline.
+        '''
+
+        return bool(CANCEL_FLAGS[self.flag]) or super().should_stop()
+
+def load_worker(cancel_flags):
+    '''
+    Runs when a worker process starts. Unpickling it imports this module, and
+    best_game_move, which loads the lexicon, so it's ready before the first search.
+
+    Parameter {RawArray} cancel_flags the cancel flags of the pool's searches.
+    '''
+
+    global CANCEL_FLAGS
+
+    CANCEL_FLAGS = cancel_flags
+
+def run_search(json_data, k, budget, instrument, flag, name, profile):
+    '''
+    Runs in a serving pool worker: searches a position (see
+    best_game_move.search_position), and profiles the search if profiling is
+    enabled in the worker (see profiling.profile_request).
+
+    Parameter {dict} json_data the position, with the game board and the
+    user's letter rack.
+    Parameter {int} k the number of moves to search for, or None for every move.
+    Parameter {float} budget the number of seconds the search may take, from
+    now, if limited.
+    Parameter {bool} instrument whether to count the work of the search.
+    Parameter {int} flag the index of the search's cancel flag.
+    Parameter {str} name the name of the endpoint, for the search's profile.
+    Parameter {bool} profile whether the request asked to be profiled.
+    Returns {dict} the result of the search, with the time.monotonic() times it
+    started and finished at.
+    '''
+
+    started = time.monotonic()
+
+    with profiling.profile_request(json_data, name, profile):
+        result = best_game_move.search_position(None, json_data, k, budget, instrument, WorkerToken(flag))
+
+    result['started'] = started
+    result['finished'] = time.monotonic()
+
+    return result
+
+def search_position(json_data, session):
+    '''
+    Parameter {dict} json_data request data with the game board and the
+    user's letter rack.
+    Parameter {GameSession} session the game session of the request, if any.
+    Returns {dict} the position to send to a worker: the request's game board
+    and rack, or the cells of the session's game board.
+    '''
+
+    if session is None:
+        return json_data
+
+    return best_game_move.worker_position(session.game_board, best_game_move.request_rack(json_data))